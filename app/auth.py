@@ -8,16 +8,55 @@ import logging
 import os
 import secrets
 import time
+from collections import OrderedDict
 from collections.abc import Awaitable, Callable
 from typing import Any
 
 from fastapi import Request, status
 from fastapi.responses import JSONResponse, Response
 from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 logger = logging.getLogger(__name__)
 
+# MCP protocol methods allowed before initialization is complete
+_PROTOCOL_METHODS = frozenset(
+    {"initialize", "notifications/initialized", "ping", "logs/setLevel"}
+)
+
+# Substrings of every method in _PROTOCOL_METHODS;
+# "initialize" also covers "notifications/initialized"
+_PROTOCOL_METHOD_MARKERS = (b"initialize", b"ping", b"logs/setLevel")
+
+# Body of the error returned to uninitialized sessions, serialized once with
+# the same compact encoding JSONResponse uses
+_INITIALIZATION_ERROR_BODY = json.dumps(
+    {
+        "error": "MCP session not initialized",
+        "message": (
+            "Client must complete MCP initialization handshake before "
+            "accessing tools. Send 'initialize' request followed by "
+            "'notifications/initialized' notification."
+        ),
+        "code": "mcp_not_initialized",
+    },
+    separators=(",", ":"),
+).encode()
+
+# Prebuilt ASGI messages for the error response, reused for every rejection
+_INITIALIZATION_ERROR_START: Message = {
+    "type": "http.response.start",
+    "status": status.HTTP_400_BAD_REQUEST,
+    "headers": [
+        (b"content-length", str(len(_INITIALIZATION_ERROR_BODY)).encode()),
+        (b"content-type", b"application/json"),
+    ],
+}
+_INITIALIZATION_ERROR_BODY_MESSAGE: Message = {
+    "type": "http.response.body",
+    "body": _INITIALIZATION_ERROR_BODY,
+}
+
 
 class BearerTokenMiddleware(BaseHTTPMiddleware):
     """Bearer token authentication middleware for FastMCP server."""
@@ -137,7 +176,7 @@ def create_auth_middleware(
     return middleware_factory
 
 
-class MCPInitializationMiddleware(BaseHTTPMiddleware):
+class MCPInitializationMiddleware:
     """
     Middleware to enforce MCP protocol initialization requirements.
 
@@ -145,6 +184,10 @@ class MCPInitializationMiddleware(BaseHTTPMiddleware):
     initialization handshake before allowing access to tools and other
     MCP resources. It tracks session state and blocks tool requests
     from uninitialized sessions.
+
+    Implemented as a plain ASGI middleware rather than a BaseHTTPMiddleware
+    so requests are not routed through an extra task group and response
+    stream on their way to the MCP app.
     """
 
     def __init__(self, app: ASGIApp) -> None:
@@ -154,19 +197,24 @@ class MCPInitializationMiddleware(BaseHTTPMiddleware):
         Args:
             app: ASGI application
         """
-        super().__init__(app)
-        # Store initialized session state with TTL (session_id -> timestamp)
-        self._initialized_sessions: dict[str, float] = {}
+        self.app = app
+        # Store initialized session state with TTL (session_id -> timestamp),
+        # kept oldest-first so expiry scans can stop at the first live session
+        self._initialized_sessions: OrderedDict[str, float] = OrderedDict()
 
         # Configuration from environment variables with safe defaults
         self._session_ttl = self._get_env_int("MCP_SESSION_TTL", 3600)  # 1 hour
         self._cleanup_interval = self._get_env_int(
             "MCP_CLEANUP_INTERVAL", 300
         )  # 5 minutes
+        # Hard cap so varying client identities cannot grow the session map
+        # without bound between cleanup runs
+        self._max_sessions = self._get_env_int("MCP_MAX_SESSIONS", 10000)
 
-        # Background cleanup task
+        # Background cleanup task and the event that tells it to stop
         self._cleanup_task: asyncio.Task[None] | None = None
         self._cleanup_started = False
+        self._stop_event: asyncio.Event | None = None
 
     def __del__(self) -> None:
         """Ensure cleanup task is stopped when middleware is destroyed."""
@@ -220,7 +268,13 @@ class MCPInitializationMiddleware(BaseHTTPMiddleware):
         Args:
             session_id: The session identifier to add
         """
-        self._initialized_sessions[session_id] = time.time()
+        self._initialized_sessions[session_id] = time.monotonic()
+        # A refreshed session becomes the newest entry
+        self._initialized_sessions.move_to_end(session_id)
+
+        # Evict the oldest sessions once the cap is exceeded, regardless of TTL
+        while len(self._initialized_sessions) > self._max_sessions:
+            self._initialized_sessions.popitem(last=False)
 
     def _cleanup_expired_sessions(self) -> int:
         """
@@ -229,20 +283,22 @@ class MCPInitializationMiddleware(BaseHTTPMiddleware):
         Returns:
             Number of sessions removed
         """
-        current_time = time.time()
-        expired_sessions = [
-            session_id
-            for session_id, timestamp in self._initialized_sessions.items()
-            if current_time - timestamp > self._session_ttl
-        ]
-
-        for session_id in expired_sessions:
-            del self._initialized_sessions[session_id]
+        current_time = time.monotonic()
+        sessions = self._initialized_sessions
+        removed = 0
+
+        # Sessions are ordered by timestamp, so stop at the first live one
+        while sessions:
+            timestamp = next(iter(sessions.values()))
+            if current_time - timestamp <= self._session_ttl:
+                break
+            sessions.popitem(last=False)
+            removed += 1
 
-        if expired_sessions:
-            logger.debug(f"Cleaned up {len(expired_sessions)} expired sessions")
+        if removed:
+            logger.debug(f"Cleaned up {removed} expired sessions")
 
-        return len(expired_sessions)
+        return removed
 
     def _start_cleanup_task(self) -> None:
         """Start the background cleanup task if in async context."""
@@ -250,37 +306,45 @@ class MCPInitializationMiddleware(BaseHTTPMiddleware):
             if not self._cleanup_started and (
                 self._cleanup_task is None or self._cleanup_task.done()
             ):
-                self._cleanup_task = asyncio.create_task(self._periodic_cleanup())
+                self._stop_event = asyncio.Event()
+                self._cleanup_task = asyncio.create_task(
+                    self._periodic_cleanup(self._stop_event)
+                )
                 self._cleanup_started = True
         except RuntimeError:
             # No event loop running - will start later when needed
             pass
 
     def _stop_cleanup_task(self) -> None:
-        """Stop the background cleanup task."""
-        if self._cleanup_task and not self._cleanup_task.done():
+        """Signal the background cleanup task to stop."""
+        if self._cleanup_task and not self._cleanup_task.done() and self._stop_event:
             try:
-                # Check if event loop is still running before cancellation
+                # Check if event loop is still running before waking the task
                 loop = asyncio.get_running_loop()
                 if loop and not loop.is_closed():
-                    self._cleanup_task.cancel()
+                    self._stop_event.set()
             except RuntimeError:
                 # No event loop running - task will be cleaned up automatically
                 pass
 
-    async def _periodic_cleanup(self) -> None:
+    async def _periodic_cleanup(self, stop_event: asyncio.Event) -> None:
         """Background task to periodically clean up expired sessions."""
-        while True:
+        while not stop_event.is_set():
             try:
-                await asyncio.sleep(self._cleanup_interval)
-                self._cleanup_expired_sessions()
-            except asyncio.CancelledError:
-                logger.debug("Cleanup task cancelled")
+                # Wake up early, and exit, as soon as a stop is requested
+                await asyncio.wait_for(stop_event.wait(), self._cleanup_interval)
                 break
+            except TimeoutError:
+                pass
+
+            try:
+                self._cleanup_expired_sessions()
             except Exception as e:
                 logger.error(f"Error in periodic cleanup: {e}")
                 # Continue running despite errors
 
+        logger.debug("Cleanup task stopped")
+
     def _is_mcp_protocol_request(self, request: Request) -> bool:
         """
         Check if this is an MCP protocol-level request that should be allowed
@@ -297,8 +361,13 @@ class MCPInitializationMiddleware(BaseHTTPMiddleware):
         if request.method != "POST":
             return False
 
+        # Match the media type itself; parameters such as charset may follow
         content_type = request.headers.get("content-type", "")
-        if "application/json" not in content_type:
+        if not content_type.startswith("application/json"):
+            return False
+
+        # A declared empty body cannot carry a protocol message
+        if request.headers.get("content-length") == "0":
             return False
 
         # We can't easily inspect the body here without consuming it,
@@ -306,39 +375,31 @@ class MCPInitializationMiddleware(BaseHTTPMiddleware):
         # in the request processing
         return True
 
-    async def _check_request_body_for_protocol(
-        self, request: Request
+    def _check_request_body_for_protocol(
+        self, body: bytes
     ) -> tuple[bool, dict[str, Any] | None]:
         """
         Check if the request body contains MCP protocol messages.
 
         Args:
-            request: The incoming request
+            body: The raw request body
 
         Returns:
             Tuple of (is_protocol_request, parsed_body)
         """
         try:
-            # Read the body
-            body = await request.body()
             if not body:
                 return False, None
 
+            # Skip the JSON parse when no allowed method name appears at all
+            if not any(marker in body for marker in _PROTOCOL_METHOD_MARKERS):
+                return False, None
+
             # Parse JSON
             data = json.loads(body.decode())
 
-            # Check for MCP protocol methods
-            method = data.get("method", "")
-
-            # Allow these MCP protocol methods before initialization
-            allowed_methods = {
-                "initialize",
-                "notifications/initialized",
-                "ping",
-                "logs/setLevel",
-            }
-
-            return method in allowed_methods, data
+            # Check for MCP protocol methods allowed before initialization
+            return data.get("method", "") in _PROTOCOL_METHODS, data
 
         except (json.JSONDecodeError, UnicodeDecodeError):
             return False, None
@@ -366,14 +427,12 @@ class MCPInitializationMiddleware(BaseHTTPMiddleware):
         Returns:
             True if session is initialized and not expired, False otherwise
         """
-        if session_id not in self._initialized_sessions:
+        session_time = self._initialized_sessions.get(session_id)
+        if session_time is None:
             return False
 
         # Check if session has expired (lazy cleanup)
-        current_time = time.time()
-        session_time = self._initialized_sessions[session_id]
-
-        if current_time - session_time > self._session_ttl:
+        if time.monotonic() - session_time > self._session_ttl:
             # Session expired, remove it
             del self._initialized_sessions[session_id]
             logger.debug(f"Session {session_id} expired and removed")
@@ -381,113 +440,113 @@ class MCPInitializationMiddleware(BaseHTTPMiddleware):
 
         return True
 
-    def _create_initialization_error(self) -> JSONResponse:
+    async def _send_initialization_error(self, send: Send) -> None:
         """
-        Create an error response for uninitialized sessions.
+        Send the error response for uninitialized sessions.
 
-        Returns:
-            JSON error response
+        The status line, headers and body are prebuilt at import, so no
+        Response object is created per rejected request.
+
+        Args:
+            send: ASGI send callable
         """
-        return JSONResponse(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            content={
-                "error": "MCP session not initialized",
-                "message": (
-                    "Client must complete MCP initialization handshake before "
-                    "accessing tools. Send 'initialize' request followed by "
-                    "'notifications/initialized' notification."
-                ),
-                "code": "mcp_not_initialized",
-            },
-        )
+        await send(_INITIALIZATION_ERROR_START)
+        await send(_INITIALIZATION_ERROR_BODY_MESSAGE)
 
-    async def dispatch(
-        self, request: Request, call_next: Callable[[Request], Awaitable[Response]]
-    ) -> Response:
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """
-        Middleware function to check MCP initialization state.
+        ASGI entry point that checks MCP initialization state.
 
         Args:
-            request: FastAPI request object
-            call_next: Next middleware/handler in the chain
-
-        Returns:
-            Response from next handler if initialized, error if not
+            scope: ASGI connection scope
+            receive: ASGI receive callable
+            send: ASGI send callable
         """
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
         # Start cleanup task if not already started
         self._start_cleanup_task()
 
+        # Only used for header and client access; the body is read directly
+        request = Request(scope)
         session_id = self._get_session_id(request)
 
+        # Body consumed while checking for protocol messages, if any
+        body: bytes | None = None
+
         # Check if this might be an MCP protocol request
         if self._is_mcp_protocol_request(request):
             # Check the actual request body
-            is_protocol, data = await self._check_request_body_for_protocol(request)
+            body = await _read_body(receive)
+            is_protocol, data = self._check_request_body_for_protocol(body)
 
             if is_protocol and data:
                 # Handle initialized notification
                 self._handle_initialized_notification(session_id, data)
 
-                # Allow protocol requests to proceed
-                # Reconstruct request with proper body for downstream processing
-                return await self._create_request_with_body(request, data, call_next)
+                # Allow protocol requests to proceed with the body replayed
+                await self.app(scope, _replay_body(body, receive), send)
+                return
 
         # For non-protocol requests, check if session is initialized
         if not self._is_session_initialized(session_id):
-            return self._create_initialization_error()
+            await self._send_initialization_error(send)
+            return
 
-        # Session is initialized, proceed normally
-        response = await call_next(request)
-        return response
+        # Session is initialized, proceed normally; only a consumed body
+        # needs replaying for downstream handlers
+        if body is not None:
+            receive = _replay_body(body, receive)
+        await self.app(scope, receive, send)
 
-    async def _create_request_with_body(
-        self,
-        request: Request,
-        data: dict[str, Any],
-        call_next: Callable[[Request], Awaitable[Response]],
-    ) -> Response:
-        """
-        Create a new request with reconstructed body for downstream processing.
 
-        This method properly handles request body reconstruction without
-        relying on internal Starlette APIs.
+async def _read_body(receive: Receive) -> bytes:
+    """
+    Read a complete HTTP request body from an ASGI receive callable.
 
-        Args:
-            request: Original request object
-            data: Parsed request body data
-            call_next: Next middleware/handler in the chain
+    Args:
+        receive: ASGI receive callable
 
-        Returns:
-            Response from downstream handlers
-        """
-        # Check if we have a proper Starlette Request with scope
-        if hasattr(request, "scope") and request.scope:
-            # Serialize the data back to JSON bytes
-            body_bytes = json.dumps(data).encode()
-
-            # Create new ASGI receive callable that provides the reconstructed body
-            async def receive() -> dict[str, Any]:
-                return {
-                    "type": "http.request",
-                    "body": body_bytes,
-                    "more_body": False,
-                }
-
-            # Create a new Request object with the reconstructed body
-            # This uses the documented Starlette API
-            new_request = Request(request.scope, receive)
-            return await call_next(new_request)
-        else:
-            # For testing or other cases where scope is not available,
-            # create a mock body method that returns the reconstructed data
-            body_bytes = json.dumps(data).encode()
-
-            async def mock_body() -> bytes:
-                return body_bytes
-
-            # Replace the body method with our reconstructed data
-            setattr(request, "body", mock_body)
-            return await call_next(request)
+    Returns:
+        The request body bytes
+    """
+    message = await receive()
+    body: bytes = message.get("body", b"")
+    if not message.get("more_body", False):
+        # Single-message bodies, the norm for JSON-RPC, need no joining
+        return body
+
+    chunks = [body]
+    while message.get("more_body", False):
+        message = await receive()
+        chunks.append(message.get("body", b""))
+    return b"".join(chunks)
+
+
+def _replay_body(body: bytes, receive: Receive) -> Receive:
+    """
+    Wrap an ASGI receive callable so it first yields an already-read body.
+
+    Args:
+        body: Request body read by the middleware
+        receive: Original ASGI receive callable
+
+    Returns:
+        Receive callable that replays the body once, then defers to receive
+    """
+    replayed = False
+
+    async def replay_receive() -> Message:
+        nonlocal replayed
+        if not replayed:
+            replayed = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # Later calls (e.g. waiting for http.disconnect) reach the client
+        return await receive()
+
+    return replay_receive
 
 
 def create_mcp_initialization_middleware() -> (
@@ -57,6 +57,13 @@ def _create_initialization_checked_http_app(original_http_app: Any) -> Any:
     return http_app_with_init_check
 
 
+def _format_result(result: Any) -> str:
+    """Render a registry or handler result as the text returned to MCP clients."""
+    return (
+        json.dumps(result, indent=2) if isinstance(result, dict | list) else str(result)
+    )
+
+
 def _register_fastmcp_tools(mcp: FastMCP, registry: ToolRegistry) -> None:
     """Register tools with FastMCP using individual functions (no **kwargs)."""
 
@@ -78,31 +85,19 @@ def _register_fastmcp_tools(mcp: FastMCP, registry: ToolRegistry) -> None:
                 "description": description,
             },
         )
-        return (
-            json.dumps(result, indent=2)
-            if isinstance(result, dict | list)
-            else str(result)
-        )
+        return _format_result(result)
 
     @mcp.tool()
     async def list_envelopes() -> str:
         """Get all budget envelopes with their current balances."""
         result = await registry.call_tool("list_envelopes", {})
-        return (
-            json.dumps(result, indent=2)
-            if isinstance(result, dict | list)
-            else str(result)
-        )
+        return _format_result(result)
 
     @mcp.tool()
     async def get_envelope(envelope_id: int) -> str:
         """Get specific envelope details by ID."""
         result = await registry.call_tool("get_envelope", {"envelope_id": envelope_id})
-        return (
-            json.dumps(result, indent=2)
-            if isinstance(result, dict | list)
-            else str(result)
-        )
+        return _format_result(result)
 
     @mcp.tool()
     async def update_envelope(
@@ -123,11 +118,7 @@ def _register_fastmcp_tools(mcp: FastMCP, registry: ToolRegistry) -> None:
         if description is not None:
             args["description"] = description
         result = await registry.call_tool("update_envelope", args)
-        return (
-            json.dumps(result, indent=2)
-            if isinstance(result, dict | list)
-            else str(result)
-        )
+        return _format_result(result)
 
     @mcp.tool()
     async def delete_envelope(envelope_id: int) -> str:
@@ -135,11 +126,7 @@ def _register_fastmcp_tools(mcp: FastMCP, registry: ToolRegistry) -> None:
         result = await registry.call_tool(
             "delete_envelope", {"envelope_id": envelope_id}
         )
-        return (
-            json.dumps(result, indent=2)
-            if isinstance(result, dict | list)
-            else str(result)
-        )
+        return _format_result(result)
 
     # Transaction tools
     @mcp.tool()
@@ -161,11 +148,7 @@ def _register_fastmcp_tools(mcp: FastMCP, registry: ToolRegistry) -> None:
         if date is not None:
             args["date"] = date
         result = await registry.call_tool("create_transaction", args)
-        return (
-            json.dumps(result, indent=2)
-            if isinstance(result, dict | list)
-            else str(result)
-        )
+        return _format_result(result)
 
     @mcp.tool()
     async def list_transactions(envelope_id: int | None = None) -> str:
@@ -174,11 +157,7 @@ def _register_fastmcp_tools(mcp: FastMCP, registry: ToolRegistry) -> None:
         if envelope_id is not None:
             args["envelope_id"] = envelope_id
         result = await registry.call_tool("list_transactions", args)
-        return (
-            json.dumps(result, indent=2)
-            if isinstance(result, dict | list)
-            else str(result)
-        )
+        return _format_result(result)
 
     @mcp.tool()
     async def get_transaction(transaction_id: int) -> str:
@@ -186,11 +165,7 @@ def _register_fastmcp_tools(mcp: FastMCP, registry: ToolRegistry) -> None:
         result = await registry.call_tool(
             "get_transaction", {"transaction_id": transaction_id}
         )
-        return (
-            json.dumps(result, indent=2)
-            if isinstance(result, dict | list)
-            else str(result)
-        )
+        return _format_result(result)
 
     @mcp.tool()
     async def update_transaction(
@@ -215,11 +190,7 @@ def _register_fastmcp_tools(mcp: FastMCP, registry: ToolRegistry) -> None:
         if date is not None:
             args["date"] = date
         result = await registry.call_tool("update_transaction", args)
-        return (
-            json.dumps(result, indent=2)
-            if isinstance(result, dict | list)
-            else str(result)
-        )
+        return _format_result(result)
 
     @mcp.tool()
     async def delete_transaction(transaction_id: int) -> str:
@@ -227,11 +198,7 @@ def _register_fastmcp_tools(mcp: FastMCP, registry: ToolRegistry) -> None:
         result = await registry.call_tool(
             "delete_transaction", {"transaction_id": transaction_id}
         )
-        return (
-            json.dumps(result, indent=2)
-            if isinstance(result, dict | list)
-            else str(result)
-        )
+        return _format_result(result)
 
     # Utility tools
     @mcp.tool()
@@ -240,61 +207,37 @@ def _register_fastmcp_tools(mcp: FastMCP, registry: ToolRegistry) -> None:
         result = await registry.call_tool(
             "get_envelope_balance", {"envelope_id": envelope_id}
         )
-        return (
-            json.dumps(result, indent=2)
-            if isinstance(result, dict | list)
-            else str(result)
-        )
+        return _format_result(result)
 
     @mcp.tool()
     async def get_budget_summary() -> str:
         """Get overall budget status and summary."""
         result = await registry.call_tool("get_budget_summary", {})
-        return (
-            json.dumps(result, indent=2)
-            if isinstance(result, dict | list)
-            else str(result)
-        )
+        return _format_result(result)
 
     @mcp.tool()
     async def get_cloud_status() -> str:
         """Get MotherDuck cloud connection status and sync information."""
         result = await registry.call_tool("get_cloud_status", {})
-        return (
-            json.dumps(result, indent=2)
-            if isinstance(result, dict | list)
-            else str(result)
-        )
+        return _format_result(result)
 
     @mcp.tool()
     async def sync_to_cloud() -> str:
         """Synchronize local data to MotherDuck cloud database."""
         result = await registry.call_tool("sync_to_cloud", {})
-        return (
-            json.dumps(result, indent=2)
-            if isinstance(result, dict | list)
-            else str(result)
-        )
+        return _format_result(result)
 
     @mcp.tool()
     async def sync_from_cloud() -> str:
         """Synchronize data from MotherDuck cloud to local database."""
         result = await registry.call_tool("sync_from_cloud", {})
-        return (
-            json.dumps(result, indent=2)
-            if isinstance(result, dict | list)
-            else str(result)
-        )
+        return _format_result(result)
 
     @mcp.tool()
     async def get_server_version() -> str:
         """Get server version and build information."""
         result = await registry.call_tool("get_server_version", {})
-        return (
-            json.dumps(result, indent=2)
-            if isinstance(result, dict | list)
-            else str(result)
-        )
+        return _format_result(result)
 
 
 def _register_fastmcp_prompts(mcp: FastMCP, registry: ToolRegistry) -> None:
@@ -314,11 +257,7 @@ def _register_fastmcp_prompts(mcp: FastMCP, registry: ToolRegistry) -> None:
                 "focus_area": focus_area,
             },
         )
-        return (
-            json.dumps(result, indent=2)
-            if isinstance(result, dict | list)
-            else str(result)
-        )
+        return _format_result(result)
 
 
 def create_fastmcp_server(
@@ -378,6 +317,7 @@ def create_fastmcp_server(
     mcp.envelope_service = envelope_service  # type: ignore[attr-defined]
     mcp.transaction_service = transaction_service  # type: ignore[attr-defined]
     mcp.db = db  # type: ignore[attr-defined]
+    mcp.tool_registry = tool_registry  # type: ignore[attr-defined]
 
     # Register tools manually since FastMCP doesn't support **kwargs
     _register_fastmcp_tools(mcp, tool_registry)
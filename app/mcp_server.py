@@ -114,19 +114,19 @@ class MCPServer:
             """List available resources."""
             return []
 
+        # Prompt schemas are static, so the listing is built once
+        prompts = [
+            types.Prompt(
+                name=prompt_name,
+                description=schema["description"],
+                arguments=schema.get("arguments", []),
+            )
+            for prompt_name, schema in get_prompt_schemas().items()
+        ]
+
         @self.server.list_prompts()
         async def handle_list_prompts() -> list[types.Prompt]:
             """List available prompts."""
-            prompt_schemas = get_prompt_schemas()
-            prompts = []
-            for prompt_name, schema in prompt_schemas.items():
-                prompts.append(
-                    types.Prompt(
-                        name=prompt_name,
-                        description=schema["description"],
-                        arguments=schema.get("arguments", []),
-                    )
-                )
             return prompts
 
         @self.server.get_prompt()
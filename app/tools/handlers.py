@@ -5,7 +5,7 @@ This module contains the business logic for all tools in a unified format.
 """
 
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 from typing import Any
 
 from app.services.envelope_service import EnvelopeService
@@ -357,13 +357,16 @@ def _generate_budget_analysis(
     transaction_service: TransactionService,
     period: str,
     focus: str,
+    now: datetime | None = None,
 ) -> dict[str, Any]:
-    """Generate comprehensive budget health analysis."""
+    """Generate comprehensive budget health analysis, relative to now by default."""
+    # Read the clock once so every period calculation shares the same instant
+    now = datetime.now() if now is None else now
     envelopes = envelope_service.get_all_envelopes()
     transactions = transaction_service.get_all_transactions()
 
     envelope_health = _analyze_envelope_health(envelopes)
-    spending_analysis = _analyze_spending_patterns(transactions, period)
+    spending_analysis = _analyze_spending_patterns(transactions, period, now)
     recommendations = _generate_recommendations(envelope_health, spending_analysis)
 
     return {
@@ -418,9 +421,11 @@ def _determine_envelope_status(balance: float, utilization: float) -> str:
         return "healthy"
 
 
-def _get_date_range_for_period(period: str) -> datetime | None:
-    """Calculate start date for analysis period."""
-    today = datetime.now()
+def _get_date_range_for_period(
+    period: str, now: datetime | None = None
+) -> datetime | None:
+    """Calculate start date for analysis period, relative to now by default."""
+    today = datetime.now() if now is None else now
 
     if period == "last_30_days":
         return today - timedelta(days=30)
@@ -435,40 +440,69 @@ def _get_date_range_for_period(period: str) -> datetime | None:
 
 
 def _filter_transactions_by_period(
-    transactions: list[dict[str, Any]], period: str
+    transactions: list[dict[str, Any]], period: str, now: datetime | None = None
 ) -> list[dict[str, Any]]:
     """Filter transactions based on analysis period."""
-    start_date = _get_date_range_for_period(period)
+    start_date = _get_date_range_for_period(period, now)
 
     if start_date is None:  # all_time
         return transactions
 
-    filtered_transactions = []
-    for transaction in transactions:
-        try:
-            transaction_date = datetime.strptime(transaction["date"], "%Y-%m-%d")
-            if transaction_date >= start_date:
-                filtered_transactions.append(transaction)
-        except (ValueError, KeyError):
-            # Skip transactions with invalid or missing dates
-            continue
-
-    return filtered_transactions
+    # Transaction dates are YYYY-MM-DD strings, which order the same as the
+    # dates themselves, so compare them against the first included day as a
+    # string. A date counts from midnight, so a start later in the day
+    # excludes that day.
+    first_day = start_date.date()
+    if start_date.time() != time.min:
+        first_day += timedelta(days=1)
+    cutoff = first_day.isoformat()
+
+    return [
+        transaction
+        for transaction in transactions
+        # Transactions with invalid or missing dates are skipped
+        if (date := _iso_date_key(transaction.get("date"))) is not None
+        and date >= cutoff
+    ]
+
+
+def _iso_date_key(value: Any) -> str | None:
+    """Return a transaction date as zero-padded YYYY-MM-DD, or None if invalid."""
+    if not isinstance(value, str):
+        return None
+    # Padded dates with a day no later than the 28th are valid in every month,
+    # so they can be used as-is without parsing
+    if (
+        len(value) == 10
+        and value.isascii()
+        and value[4] == value[7] == "-"
+        and (value[:4] + value[5:7] + value[8:]).isdigit()
+        and value[:4] != "0000"
+        and "01" <= value[5:7] <= "12"
+        and "01" <= value[8:] <= "28"
+    ):
+        return value
+    # Anything else, such as the 31st or an unpadded "2025-8-1", gets a full parse
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date().isoformat()
+    except ValueError:
+        return None
 
 
 def _analyze_spending_patterns(
-    transactions: list[dict[str, Any]], period: str
+    transactions: list[dict[str, Any]], period: str, now: datetime
 ) -> dict[str, Any]:
     """Analyze spending patterns from transaction data."""
     # Filter transactions based on the specified period
-    filtered_transactions = _filter_transactions_by_period(transactions, period)
-
-    total_expenses = sum(
-        abs(t["amount"]) for t in filtered_transactions if t["type"] == "expense"
-    )
-    total_income = sum(
-        t["amount"] for t in filtered_transactions if t["type"] == "income"
-    )
+    filtered_transactions = _filter_transactions_by_period(transactions, period, now)
+
+    # Accumulate both totals in a single pass over the transactions
+    total_expenses = total_income = 0
+    for transaction in filtered_transactions:
+        if transaction["type"] == "expense":
+            total_expenses += abs(transaction["amount"])
+        elif transaction["type"] == "income":
+            total_income += transaction["amount"]
 
     return {
         "total_expenses": total_expenses,
@@ -1,19 +1,24 @@
 import pytest
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
+from fastmcp import FastMCP
 
 from app.fastmcp_server import create_fastmcp_server
 
 
 @pytest.fixture(scope="session")
-def app() -> FastAPI:
-    """Session-wide test `FastAPI` application."""
-    # Create a new app instance for testing using the 'testing' configuration
+def fastmcp_server() -> FastMCP:
+    """Session-wide FastMCP server built from the 'testing' configuration."""
     # Disable authentication and initialization check for testing purposes
-    mcp = create_fastmcp_server(
+    return create_fastmcp_server(
         config_name="testing", enable_auth=False, enable_init_check=False
     )
-    return mcp.http_app()
+
+
+@pytest.fixture(scope="session")
+def app(fastmcp_server: FastMCP) -> FastAPI:
+    """Session-wide test `FastAPI` application."""
+    return fastmcp_server.http_app()
 
 
 @pytest.fixture
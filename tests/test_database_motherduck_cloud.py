@@ -1,10 +1,16 @@
 from unittest.mock import Mock, call, patch
 
-import duckdb
 import pytest
+from duckdb import Error as DuckDBError
 
 from app.models.database import Database
 
+# Attribute surface of the DuckDB connections these tests hand to Database
+_CONN_SPEC = ["close", "execute", "cursor", "commit"]
+
+# Shared MotherDuck settings; Database only reads from this mapping
+_MD_CFG: dict[str, str] = {"token": "test_token", "database": "test_db"}
+
 
 class TestMotherDuckCloudMode:
     """Test suite for MotherDuck cloud mode with database creation and fallback."""
@@ -13,17 +19,12 @@ class TestMotherDuckCloudMode:
     def test_cloud_mode_db_creation_success(self, mock_connect: Mock) -> None:
         """Test successful cloud mode with DB pre-creation."""
         # Mock successful connections for both creation and main connection
-        mock_creation_conn = Mock()
-        mock_main_conn = Mock()
+        mock_creation_conn = Mock(spec_set=_CONN_SPEC)
+        mock_main_conn = Mock(spec_set=_CONN_SPEC)
         mock_connect.side_effect = [mock_creation_conn, mock_main_conn]
 
-        # Test configuration
-        motherduck_config = {"token": "test_token", "database": "test_db"}
-
         # Initialize database in cloud mode
-        db = Database(
-            db_path=":memory:", mode="cloud", motherduck_config=motherduck_config
-        )
+        db = Database(db_path=":memory:", mode="cloud", motherduck_config=_MD_CFG)
 
         # Verify pre-creation connection was made and closed
         assert mock_connect.call_count == 2
@@ -50,23 +51,21 @@ class TestMotherDuckCloudMode:
     ) -> None:
         """Test cloud mode falling back to local when DB creation fails and main connection also fails."""
         # Mock failed creation, failed main connection, successful local fallback
-        mock_local_conn = Mock()
+        mock_local_conn = Mock(spec_set=_CONN_SPEC)
         mock_connect.side_effect = [
-            duckdb.Error(
+            DuckDBError(
                 "MotherDuck DB creation failed"
             ),  # Creation fails (logged only)
-            duckdb.Error(
+            DuckDBError(
                 "MotherDuck main connection failed"
             ),  # Main connection fails (triggers fallback)
             mock_local_conn,  # Local fallback succeeds
         ]
 
-        motherduck_config = {"token": "invalid_token", "database": "test_db"}
+        invalid_config = {"token": "invalid_token", "database": "test_db"}
 
         # Initialize database in cloud mode
-        db = Database(
-            db_path="test.db", mode="cloud", motherduck_config=motherduck_config
-        )
+        db = Database(db_path="test.db", mode="cloud", motherduck_config=invalid_config)
 
         # Verify fallback occurred
         assert db.is_cloud_connected is False
@@ -81,20 +80,16 @@ class TestMotherDuckCloudMode:
     ) -> None:
         """Test cloud mode falling back when main connection fails after successful creation."""
         # Mock successful creation, failed main connection, successful local fallback
-        mock_creation_conn = Mock()
-        mock_local_conn = Mock()
+        mock_creation_conn = Mock(spec_set=_CONN_SPEC)
+        mock_local_conn = Mock(spec_set=_CONN_SPEC)
         mock_connect.side_effect = [
             mock_creation_conn,  # Creation succeeds
-            duckdb.Error("Main connection failed"),  # Main connection fails
+            DuckDBError("Main connection failed"),  # Main connection fails
             mock_local_conn,  # Local fallback succeeds
         ]
 
-        motherduck_config = {"token": "test_token", "database": "test_db"}
-
         # Initialize database in cloud mode
-        db = Database(
-            db_path="test.db", mode="cloud", motherduck_config=motherduck_config
-        )
+        db = Database(db_path="test.db", mode="cloud", motherduck_config=_MD_CFG)
 
         # Verify creation connection was closed
         mock_creation_conn.close.assert_called_once()
@@ -109,20 +104,16 @@ class TestMotherDuckCloudMode:
         """Test connection status includes fallback warnings for cloud mode."""
         with patch("app.models.database.duckdb.connect") as mock_connect:
             # Mock fallback scenario - creation fails, main connection fails, local succeeds
-            mock_local_conn = Mock()
+            mock_local_conn = Mock(spec_set=_CONN_SPEC)
             mock_connect.side_effect = [
-                duckdb.Error("Creation failed"),  # Creation fails (logged only)
-                duckdb.Error(
+                DuckDBError("Creation failed"),  # Creation fails (logged only)
+                DuckDBError(
                     "Main connection failed"
                 ),  # Main connection fails (triggers fallback)
                 mock_local_conn,  # Local succeeds
             ]
 
-            motherduck_config = {"token": "test_token", "database": "test_db"}
-
-            db = Database(
-                db_path="test.db", mode="cloud", motherduck_config=motherduck_config
-            )
+            db = Database(db_path="test.db", mode="cloud", motherduck_config=_MD_CFG)
 
             # Get connection status
             status = db.get_connection_status()
@@ -141,17 +132,13 @@ class TestMotherDuckCloudMode:
     def test_hybrid_mode_connectivity_check_success(self, mock_connect: Mock) -> None:
         """Test that hybrid mode correctly verifies cloud availability."""
         # Mock the three connections: creation, local, and the test connection for cloud
-        mock_creation_conn = Mock()
-        mock_local_conn = Mock()
-        mock_test_conn = Mock()
+        mock_creation_conn = Mock(spec_set=_CONN_SPEC)
+        mock_local_conn = Mock(spec_set=_CONN_SPEC)
+        mock_test_conn = Mock(spec_set=_CONN_SPEC)
         mock_connect.side_effect = [mock_creation_conn, mock_local_conn, mock_test_conn]
 
-        motherduck_config = {"token": "test_token", "database": "test_db"}
-
         # Initialize database in hybrid mode
-        db = Database(
-            db_path="test.db", mode="hybrid", motherduck_config=motherduck_config
-        )
+        db = Database(db_path="test.db", mode="hybrid", motherduck_config=_MD_CFG)
 
         # Verify that the cloud is marked as available
         assert db.is_cloud_connected is True
@@ -168,27 +155,29 @@ class TestMotherDuckCloudMode:
         """Test cloud mode when both MotherDuck and local fallback fail."""
         # Mock all connections failing - need 3 calls: creation, main, local fallback
         mock_connect.side_effect = [
-            duckdb.Error("MotherDuck creation failed"),  # Creation fails (logged only)
-            duckdb.Error(
+            DuckDBError("MotherDuck creation failed"),  # Creation fails (logged only)
+            DuckDBError(
                 "MotherDuck main connection failed"
             ),  # Main connection fails (triggers fallback)
-            duckdb.Error("Local fallback failed"),  # Local fails
+            DuckDBError("Local fallback failed"),  # Local fails
         ]
 
-        motherduck_config = {"token": "test_token", "database": "test_db"}
-
         # Should raise exception when all connections fail
-        with pytest.raises(duckdb.Error, match="Local fallback failed"):
+        with pytest.raises(DuckDBError, match="Local fallback failed"):
             Database(
                 db_path="invalid_path.db",
                 mode="cloud",
-                motherduck_config=motherduck_config,
+                motherduck_config=_MD_CFG,
             )
 
     def test_local_mode_unaffected_by_changes(self) -> None:
         """Test that local mode behavior is unchanged."""
-        with patch("app.models.database.duckdb.connect") as mock_connect:
-            mock_conn = Mock()
+        # Skip schema setup so only the connection-dispatch path runs
+        with (
+            patch("app.models.database.duckdb.connect") as mock_connect,
+            patch.object(Database, "_create_tables", return_value=None),
+        ):
+            mock_conn = Mock(spec_set=_CONN_SPEC)
             mock_connect.return_value = mock_conn
 
             # Initialize database in local mode
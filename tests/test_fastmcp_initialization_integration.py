@@ -2,6 +2,8 @@
 Integration tests for MCP initialization middleware with FastMCP server factory.
 """
 
+from typing import Any
+
 import pytest
 from fastmcp import FastMCP
 
@@ -11,42 +13,34 @@ from app.fastmcp_server import create_fastmcp_server
 class TestFastMCPInitializationIntegration:
     """Test suite for MCP initialization middleware integration."""
 
-    def test_create_server_with_init_check_enabled(self) -> None:
-        """Test server creation with initialization check enabled."""
-        server = create_fastmcp_server(
-            config_name="testing", enable_auth=False, enable_init_check=True
-        )
-
-        assert isinstance(server, FastMCP)
-        assert server.name == "budget-envelope-server"
-
-    def test_create_server_with_init_check_disabled(self) -> None:
-        """Test server creation with initialization check disabled."""
-        server = create_fastmcp_server(
-            config_name="testing", enable_auth=False, enable_init_check=False
-        )
-
-        assert isinstance(server, FastMCP)
-        assert server.name == "budget-envelope-server"
-
-    def test_create_server_with_both_middleware_enabled(self) -> None:
-        """Test server creation with both auth and init check enabled."""
-        # Note: This test doesn't actually test auth since we'd need a real bearer token
-        # in the testing config, but it tests that the server can be created
-        server = create_fastmcp_server(
-            config_name="testing", enable_auth=True, enable_init_check=True
-        )
-
-        assert isinstance(server, FastMCP)
-        assert server.name == "budget-envelope-server"
-
-    def test_create_server_defaults(self) -> None:
-        """Test server creation with default parameters."""
-        server = create_fastmcp_server(config_name="testing")
+    @pytest.mark.parametrize(
+        "enable_auth,enable_init_check",
+        [
+            (False, True),
+            (False, False),
+            (True, True),
+            (True, False),
+            (None, None),
+        ],
+        ids=["only_init_check", "neither", "both", "only_auth", "defaults"],
+    )
+    def test_create_server_variants(
+        self, enable_auth: bool | None, enable_init_check: bool | None
+    ) -> None:
+        """Test server creation across middleware flag combinations."""
+        # None leaves the flag unset so the factory default (enabled) applies.
+        # Auth is only applied with a configured bearer token, so enabling it
+        # here only verifies that the server can be created.
+        kwargs: dict[str, Any] = {"config_name": "testing"}
+        if enable_auth is not None:
+            kwargs["enable_auth"] = enable_auth
+        if enable_init_check is not None:
+            kwargs["enable_init_check"] = enable_init_check
+
+        server = create_fastmcp_server(**kwargs)
 
         assert isinstance(server, FastMCP)
         assert server.name == "budget-envelope-server"
-        # By default, both auth and init check should be enabled
 
     @pytest.mark.asyncio
     async def test_server_tools_available(self) -> None:
@@ -78,32 +72,3 @@ class TestFastMCPInitializationIntegration:
 
         tool_names = set(tools.keys())
         assert expected_tools.issubset(tool_names)
-
-    def test_middleware_configuration_only_auth(self) -> None:
-        """Test middleware configuration with only auth enabled."""
-        server = create_fastmcp_server(
-            config_name="testing",
-            enable_auth=False,  # Would be True with real token
-            enable_init_check=False,
-        )
-
-        # Server should be created successfully
-        assert isinstance(server, FastMCP)
-
-    def test_middleware_configuration_only_init_check(self) -> None:
-        """Test middleware configuration with only init check enabled."""
-        server = create_fastmcp_server(
-            config_name="testing", enable_auth=False, enable_init_check=True
-        )
-
-        # Server should be created successfully
-        assert isinstance(server, FastMCP)
-
-    def test_middleware_configuration_neither_enabled(self) -> None:
-        """Test middleware configuration with neither middleware enabled."""
-        server = create_fastmcp_server(
-            config_name="testing", enable_auth=False, enable_init_check=False
-        )
-
-        # Server should be created successfully
-        assert isinstance(server, FastMCP)
@@ -1,58 +1,136 @@
-import asyncio
-import json
-from collections.abc import Generator
+from collections.abc import Awaitable, Callable, Generator
+from typing import Any
 
+import orjson
 import pytest
+import pytest_asyncio
 from fastmcp import FastMCP
 
-from app.fastmcp_server import create_fastmcp_server
+from app.fastmcp_server import _format_result
+
+loads = orjson.loads
+
+MakeEnvelope = Callable[..., Awaitable[dict[str, Any]]]
+
+_EXPECTED_TOOLS = frozenset(
+    {
+        "create_envelope",
+        "list_envelopes",
+        "get_envelope",
+        "update_envelope",
+        "delete_envelope",
+        "create_transaction",
+        "list_transactions",
+        "get_transaction",
+        "update_transaction",
+        "delete_transaction",
+        "get_envelope_balance",
+        "get_budget_summary",
+    }
+)
 
 
 class TestFastMCPTools:
     """Test suite for FastMCP tools functionality."""
 
-    @pytest.fixture
-    def server(self) -> FastMCP:
-        """Create a test FastMCP server instance."""
-        return create_fastmcp_server(
-            "testing", enable_auth=False, enable_init_check=False
-        )
+    @pytest.fixture(scope="session")
+    def server(self, fastmcp_server: FastMCP) -> FastMCP:
+        """Use the session-wide test FastMCP server from conftest."""
+        return fastmcp_server
+
+    @pytest_asyncio.fixture(scope="session", loop_scope="session")
+    async def tools(self, server: FastMCP) -> dict[str, Any]:
+        """Resolve the server's registered tools once per session."""
+        return await server.get_tools()
 
     @pytest.fixture
-    def event_loop(self) -> Generator[asyncio.AbstractEventLoop, None, None]:
-        """Create an event loop for async tests."""
-        loop = asyncio.new_event_loop()
-        yield loop
-        loop.close()
+    def make_envelope(self, server: FastMCP) -> MakeEnvelope:
+        """Return a factory that creates an envelope and returns its data."""
+        # Setup goes straight to the registry so it skips the JSON round-trip;
+        # the create_envelope wrapper is exercised by test_create_envelope_tool.
+        registry = server.tool_registry  # type: ignore[attr-defined]
+
+        async def _make(**overrides: Any) -> dict[str, Any]:
+            kwargs: dict[str, Any] = {
+                "category": "Test Envelope",
+                "budgeted_amount": 500.0,
+                "starting_balance": 300.0,
+                "description": "Test envelope",
+            }
+            kwargs.update(overrides)
+            result: dict[str, Any] = await registry.call_tool("create_envelope", kwargs)
+            return result
+
+        return _make
+
+    @pytest.fixture(autouse=True)
+    def _clean_db(self, server: FastMCP) -> Generator[None, None, None]:
+        """Clear envelopes and transactions after each test."""
+        yield
+        # Delete children first; DuckDB checks the foreign key per statement
+        server.db.conn.execute("DELETE FROM transactions;")
+        server.db.conn.execute("DELETE FROM envelopes;")
 
     @pytest.mark.asyncio
-    async def test_create_envelope_tool(self, server: FastMCP) -> None:
-        """Test the create_envelope FastMCP tool."""
-        # Get the tool function from server
-        tools = await server.get_tools()
-        create_envelope_tool = tools["create_envelope"]
+    async def test_create_envelope_tool(self, tools: dict[str, Any]) -> None:
+        """Test the create_envelope FastMCP tool's JSON output."""
+        result = loads(
+            await tools["create_envelope"].fn(
+                category="Groceries",
+                budgeted_amount=500.0,
+                starting_balance=100.0,
+                description="Monthly grocery budget",
+            )
+        )
 
-        # Test creating an envelope
-        result = await create_envelope_tool.fn(
+        assert "id" in result
+        expected = {
+            "category": "Groceries",
+            "budgeted_amount": 500.0,
+            "starting_balance": 100.0,
+            "current_balance": 100.0,
+        }
+        assert expected.items() <= result.items()
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "tool_name,kwargs,expected",
+        [
+            ("get_envelope_balance", {}, {"current_balance": 100.0}),
+            (
+                "update_envelope",
+                {"category": "Updated Category", "budgeted_amount": 600.0},
+                {"category": "Updated Category", "budgeted_amount": 600.0},
+            ),
+        ],
+        ids=["balance", "update"],
+    )
+    async def test_envelope_tools(
+        self,
+        tools: dict[str, Any],
+        make_envelope: MakeEnvelope,
+        tool_name: str,
+        kwargs: dict[str, Any],
+        expected: dict[str, Any],
+    ) -> None:
+        """Test envelope tools against a freshly created envelope."""
+        envelope_data = await make_envelope(
             category="Groceries",
             budgeted_amount=500.0,
             starting_balance=100.0,
             description="Monthly grocery budget",
         )
-
-        # Parse the JSON response
-        envelope_data = json.loads(result)
-        assert envelope_data["category"] == "Groceries"
-        assert envelope_data["budgeted_amount"] == 500.0
-        assert envelope_data["starting_balance"] == 100.0
-        assert envelope_data["current_balance"] == 100.0
         assert "id" in envelope_data
 
+        result = loads(
+            await tools[tool_name].fn(envelope_id=envelope_data["id"], **kwargs)
+        )
+
+        assert expected.items() <= result.items()
+
     @pytest.mark.asyncio
-    async def test_list_envelopes_tool(self, server: FastMCP) -> None:
+    async def test_list_envelopes_tool(self, tools: dict[str, Any]) -> None:
         """Test the list_envelopes FastMCP tool."""
-        # Get the tool functions from server
-        tools = await server.get_tools()
         create_envelope_tool = tools["create_envelope"]
         list_envelopes_tool = tools["list_envelopes"]
 
@@ -68,34 +146,26 @@ class TestFastMCPTools:
         result = await list_envelopes_tool.fn()
 
         # Parse the JSON response
-        envelopes_data = json.loads(result)
+        envelopes_data = loads(result)
         assert isinstance(envelopes_data, list)
         assert len(envelopes_data) >= 1
 
         # Check the created envelope is in the list
-        test_envelope = next(
-            (env for env in envelopes_data if env["category"] == "Test Category"), None
-        )
+        by_category = {env["category"]: env for env in envelopes_data}
+        test_envelope = by_category.get("Test Category")
         assert test_envelope is not None
-        assert test_envelope["budgeted_amount"] == 200.0
-        assert test_envelope["starting_balance"] == 50.0
+        expected = {"budgeted_amount": 200.0, "starting_balance": 50.0}
+        assert expected.items() <= test_envelope.items()
 
     @pytest.mark.asyncio
-    async def test_create_transaction_tool(self, server: FastMCP) -> None:
+    async def test_create_transaction_tool(
+        self, tools: dict[str, Any], make_envelope: MakeEnvelope
+    ) -> None:
         """Test the create_transaction FastMCP tool."""
-        # Get the tool functions from server
-        tools = await server.get_tools()
-        create_envelope_tool = tools["create_envelope"]
         create_transaction_tool = tools["create_transaction"]
 
         # Create an envelope first
-        envelope_result = await create_envelope_tool.fn(
-            category="Test Budget",
-            budgeted_amount=300.0,
-            starting_balance=200.0,
-            description="Test budget for transactions",
-        )
-        envelope_data = json.loads(envelope_result)
+        envelope_data = await make_envelope(category="Test Budget")
         envelope_id = envelope_data["id"]
 
         # Test creating a transaction
@@ -108,31 +178,29 @@ class TestFastMCPTools:
         )
 
         # Parse the JSON response
-        transaction_data = json.loads(result)
-        assert transaction_data["envelope_id"] == envelope_id
-        assert transaction_data["amount"] == 50.0
-        assert transaction_data["description"] == "Test grocery purchase"
-        assert transaction_data["date"] == "2024-01-15"
-        assert transaction_data["type"] == "expense"
+        transaction_data = loads(result)
+        expected = {
+            "envelope_id": envelope_id,
+            "amount": 50.0,
+            "description": "Test grocery purchase",
+            "date": "2024-01-15",
+            "type": "expense",
+        }
+        assert expected.items() <= transaction_data.items()
         assert "id" in transaction_data
 
     @pytest.mark.asyncio
-    async def test_get_budget_summary_tool(self, server: FastMCP) -> None:
+    async def test_get_budget_summary_tool(
+        self, tools: dict[str, Any], make_envelope: MakeEnvelope
+    ) -> None:
         """Test the get_budget_summary FastMCP tool."""
-        # Get the tool functions from server
-        tools = await server.get_tools()
-        create_envelope_tool = tools["create_envelope"]
         create_transaction_tool = tools["create_transaction"]
         get_budget_summary_tool = tools["get_budget_summary"]
 
         # Create test data
-        envelope_result = await create_envelope_tool.fn(
-            category="Summary Test",
-            budgeted_amount=1000.0,
-            starting_balance=800.0,
-            description="Test envelope for summary",
+        envelope_data = await make_envelope(
+            category="Summary Test", budgeted_amount=1000.0
         )
-        envelope_data = json.loads(envelope_result)
         envelope_id = envelope_data["id"]
 
         # Add a transaction
@@ -148,20 +216,20 @@ class TestFastMCPTools:
         result = await get_budget_summary_tool.fn()
 
         # Parse the JSON response
-        summary_data = json.loads(result)
-        assert "total_envelopes" in summary_data
-        assert "total_budgeted" in summary_data
-        assert "total_current_balance" in summary_data
-        assert "envelopes" in summary_data
+        summary_data = loads(result)
+        assert {
+            "total_envelopes",
+            "total_budgeted",
+            "total_current_balance",
+            "envelopes",
+        } <= summary_data.keys()
 
         assert summary_data["total_budgeted"] >= 1000.0
         assert summary_data["total_envelopes"] >= 1
 
     @pytest.mark.asyncio
-    async def test_error_handling(self, server: FastMCP) -> None:
+    async def test_error_handling(self, tools: dict[str, Any]) -> None:
         """Test error handling in FastMCP tools."""
-        # Get the tool function from server
-        tools = await server.get_tools()
         create_envelope_tool = tools["create_envelope"]
 
         # Test creating envelope with invalid data
@@ -175,83 +243,42 @@ class TestFastMCPTools:
         assert "Error:" in result
 
     @pytest.mark.asyncio
-    async def test_tool_availability(self, server) -> None:
+    async def test_tool_availability(self, tools: dict[str, Any]) -> None:
         """Test that all expected tools are available."""
-        tools = await server.get_tools()
-
-        expected_tools = [
-            "create_envelope",
-            "list_envelopes",
-            "get_envelope",
-            "update_envelope",
-            "delete_envelope",
-            "create_transaction",
-            "list_transactions",
-            "get_transaction",
-            "update_transaction",
-            "delete_transaction",
-            "get_envelope_balance",
-            "get_budget_summary",
-        ]
-
-        for tool_name in expected_tools:
-            assert tool_name in tools, f"Tool '{tool_name}' not found in server tools"
-
-    @pytest.mark.asyncio
-    async def test_envelope_balance_tool(self, server) -> None:
-        """Test the get_envelope_balance FastMCP tool."""
-        # Get the tool functions from server
-        tools = await server.get_tools()
-        create_envelope_tool = tools["create_envelope"]
-        get_envelope_balance_tool = tools["get_envelope_balance"]
-
-        # Create an envelope
-        envelope_result = await create_envelope_tool.fn(
-            category="Balance Test",
-            budgeted_amount=500.0,
-            starting_balance=300.0,
-            description="Test envelope for balance",
-        )
-        envelope_data = json.loads(envelope_result)
-        envelope_id = envelope_data["id"]
-
-        # Test getting envelope balance
-        result = await get_envelope_balance_tool.fn(envelope_id=envelope_id)
-
-        # Parse the JSON response
-        balance_data = json.loads(result)
-        assert "current_balance" in balance_data
-        assert balance_data["current_balance"] == 300.0
+        missing = _EXPECTED_TOOLS - tools.keys()
+        assert not missing, f"Tools not found in server tools: {sorted(missing)}"
 
     @pytest.mark.asyncio
-    async def test_update_and_delete_envelope(self, server) -> None:
-        """Test updating and deleting envelopes."""
-        # Get the tool functions from server
-        tools = await server.get_tools()
-        create_envelope_tool = tools["create_envelope"]
-        update_envelope_tool = tools["update_envelope"]
+    async def test_delete_envelope_tool(
+        self, tools: dict[str, Any], make_envelope: MakeEnvelope
+    ) -> None:
+        """Test deleting an envelope."""
         delete_envelope_tool = tools["delete_envelope"]
 
-        # Create an envelope
-        envelope_result = await create_envelope_tool.fn(
-            category="Update Test",
-            budgeted_amount=400.0,
-            starting_balance=200.0,
-            description="Test envelope for updates",
-        )
-        envelope_data = json.loads(envelope_result)
-        envelope_id = envelope_data["id"]
-
-        # Test updating envelope
-        update_result = await update_envelope_tool.fn(
-            envelope_id=envelope_id, category="Updated Category", budgeted_amount=600.0
-        )
-        updated_data = json.loads(update_result)
-        assert updated_data["category"] == "Updated Category"
-        assert updated_data["budgeted_amount"] == 600.0
+        envelope_data = await make_envelope(category="Delete Test")
 
-        # Test deleting envelope
-        delete_result = await delete_envelope_tool.fn(envelope_id=envelope_id)
-        delete_data = json.loads(delete_result)
+        delete_result = await delete_envelope_tool.fn(envelope_id=envelope_data["id"])
+        delete_data = loads(delete_result)
         assert "message" in delete_data
         assert "deleted" in delete_data["message"].lower()
+
+    @pytest.mark.parametrize(
+        "result,expected",
+        [
+            (
+                {"category": "Café", "tags": [], "meta": {}},
+                '{\n  "category": "Caf\\u00e9",\n  "tags": [],\n  "meta": {}\n}',
+            ),
+            ({1: "one"}, '{\n  "1": "one"\n}'),
+            (
+                [{"id": 1, "amount": -12.5, "description": None}],
+                '[\n  {\n    "id": 1,\n    "amount": -12.5,\n'
+                '    "description": null\n  }\n]',
+            ),
+            ("Error: Envelope not found", "Error: Envelope not found"),
+        ],
+        ids=["non_ascii", "int_keys", "list", "text"],
+    )
+    def test_format_result(self, result: Any, expected: str) -> None:
+        """Test that tool output is indented, ASCII-escaped JSON or plain text."""
+        assert _format_result(result) == expected
@@ -3,42 +3,153 @@ Tests for MCP initialization check middleware.
 """
 
 import asyncio
-import json
 import time
-from unittest.mock import AsyncMock, Mock, patch
+from collections.abc import AsyncGenerator, Mapping
+from dataclasses import dataclass, field
+from types import MappingProxyType, SimpleNamespace
+from typing import Any
+from unittest.mock import Mock, patch
 
+import orjson
 import pytest
-from fastapi import Request, status
-from fastapi.responses import JSONResponse
+import pytest_asyncio
+from fastapi import status
+from starlette.types import Message, Receive, Scope, Send
 
 from app.auth import MCPInitializationMiddleware
 
+# Session id derived from the client address and user agent used below
+_SESSION_ID = "127.0.0.1:test-client"
+# Read-only so tests can share it without copying
+_JSON_HEADERS: Mapping[str, str] = MappingProxyType(
+    {"content-type": "application/json", "user-agent": "test-client"}
+)
+
+# JSON-RPC messages shared across tests, encoded once at import
+_INITIALIZE = {
+    "jsonrpc": "2.0",
+    "id": 1,
+    "method": "initialize",
+    "params": {"protocolVersion": "2024-11-05"},
+}
+_INITIALIZED = {"jsonrpc": "2.0", "method": "notifications/initialized"}
+_PING = {"jsonrpc": "2.0", "id": 2, "method": "ping"}
+_TOOLS_LIST = {"jsonrpc": "2.0", "id": 3, "method": "tools/list"}
+_TOOLS_CALL = {
+    "jsonrpc": "2.0",
+    "id": 4,
+    "method": "tools/call",
+    "params": {"name": "create_envelope", "arguments": {}},
+}
+_INITIALIZE_BODY = orjson.dumps(_INITIALIZE)
+_INITIALIZED_BODY = orjson.dumps(_INITIALIZED)
+_PING_BODY = orjson.dumps(_PING)
+_TOOLS_LIST_BODY = orjson.dumps(_TOOLS_LIST)
+_TOOLS_CALL_BODY = orjson.dumps(_TOOLS_CALL)
+
+# Wire format of the error returned to uninitialized sessions
+_EXPECTED_ERROR_BODY = (
+    b'{"error":"MCP session not initialized",'
+    b'"message":"Client must complete MCP initialization handshake before '
+    b"accessing tools. Send 'initialize' request followed by "
+    b"'notifications/initialized' notification."
+    b'","code":"mcp_not_initialized"}'
+)
+
+
+@dataclass
+class _FakeRequest:
+    """Stand-in for the Request attributes the middleware helpers read."""
+
+    method: str = "POST"
+    headers: Mapping[str, str] = _JSON_HEADERS
+    client: SimpleNamespace | None = field(
+        default_factory=lambda: SimpleNamespace(host="127.0.0.1")
+    )
+
+
+class _RecordingApp:
+    """Downstream ASGI app that records request bodies and responds 200."""
+
+    def __init__(self) -> None:
+        self.bodies: list[bytes] = []
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        message = await receive()
+        self.bodies.append(message.get("body", b""))
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+
+async def _call_middleware(
+    middleware: MCPInitializationMiddleware,
+    *,
+    method: str = "POST",
+    headers: Mapping[str, str] | None = None,
+    body: bytes = b"",
+    chunk_size: int | None = None,
+) -> int:
+    """Send one HTTP request through the middleware and return the status."""
+    scope: Scope = {
+        "type": "http",
+        "method": method,
+        "path": "/mcp/",
+        "query_string": b"",
+        "headers": [
+            (key.encode(), value.encode())
+            for key, value in (headers or _JSON_HEADERS).items()
+        ],
+        "client": ("127.0.0.1", 50000),
+    }
+    # Optionally split the body across several http.request messages
+    size = chunk_size or max(len(body), 1)
+    chunks = [body[i : i + size] for i in range(0, len(body), size)] or [b""]
+    incoming: list[Message] = [
+        {"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+        for i, chunk in enumerate(chunks)
+    ]
+    sent: list[Message] = []
+
+    async def receive() -> Message:
+        return incoming.pop(0) if incoming else {"type": "http.disconnect"}
+
+    async def send(message: Message) -> None:
+        sent.append(message)
+
+    await middleware(scope, receive, send)
+    return int(sent[0]["status"])
+
+
+async def _shutdown_cleanup_task(middleware: MCPInitializationMiddleware) -> None:
+    """Stop the middleware's background cleanup task and wait for it to exit."""
+    middleware._stop_cleanup_task()
+    if middleware._cleanup_task is not None:
+        await asyncio.wait_for(middleware._cleanup_task, timeout=1)
+
 
 class TestMCPInitializationMiddleware:
     """Test suite for MCP initialization check middleware."""
 
     @pytest.fixture
-    def middleware(self) -> MCPInitializationMiddleware:
-        """Create a test middleware instance."""
-        mock_app = Mock()
-        return MCPInitializationMiddleware(mock_app)
-
-    @pytest.fixture
-    def mock_request(self) -> Mock:
-        """Create a mock request object."""
-        request = Mock(spec=Request)
-        request.method = "POST"
-        request.headers = {"content-type": "application/json"}
-        request.client = Mock()
-        request.client.host = "127.0.0.1"
-        return request
+    def downstream(self) -> _RecordingApp:
+        """Create the downstream ASGI app wrapped by the middleware."""
+        return _RecordingApp()
+
+    @pytest_asyncio.fixture
+    async def middleware(
+        self, downstream: _RecordingApp
+    ) -> AsyncGenerator[MCPInitializationMiddleware, None]:
+        """Create a test middleware instance and stop its cleanup task after."""
+        middleware = MCPInitializationMiddleware(downstream)
+        yield middleware
+        await _shutdown_cleanup_task(middleware)
 
     def test_get_session_id(self, middleware: MCPInitializationMiddleware) -> None:
         """Test session ID generation."""
-        request = Mock()
-        request.client = Mock()
-        request.client.host = "192.168.1.1"
-        request.headers = {"user-agent": "test-client/1.0"}
+        request = _FakeRequest(
+            client=SimpleNamespace(host="192.168.1.1"),
+            headers={"user-agent": "test-client/1.0"},
+        )
 
         session_id = middleware._get_session_id(request)
         assert session_id == "192.168.1.1:test-client/1.0"
@@ -47,9 +158,7 @@ class TestMCPInitializationMiddleware:
         self, middleware: MCPInitializationMiddleware
     ) -> None:
         """Test session ID generation when client is None."""
-        request = Mock()
-        request.client = None
-        request.headers = {"user-agent": "test-client/1.0"}
+        request = _FakeRequest(client=None, headers={"user-agent": "test-client/1.0"})
 
         session_id = middleware._get_session_id(request)
         assert session_id == "unknown:test-client/1.0"
@@ -58,10 +167,7 @@ class TestMCPInitializationMiddleware:
         self, middleware: MCPInitializationMiddleware
     ) -> None:
         """Test session ID generation when user agent is missing."""
-        request = Mock()
-        request.client = Mock()
-        request.client.host = "192.168.1.1"
-        request.headers = {}
+        request = _FakeRequest(client=SimpleNamespace(host="192.168.1.1"), headers={})
 
         session_id = middleware._get_session_id(request)
         assert session_id == "192.168.1.1:unknown"
@@ -70,9 +176,9 @@ class TestMCPInitializationMiddleware:
         self, middleware: MCPInitializationMiddleware
     ) -> None:
         """Test MCP protocol request detection for valid requests."""
-        request = Mock()
-        request.method = "POST"
-        request.headers = {"content-type": "application/json"}
+        request = _FakeRequest(
+            method="POST", headers={"content-type": "application/json"}
+        )
 
         assert middleware._is_mcp_protocol_request(request) is True
 
@@ -80,9 +186,9 @@ class TestMCPInitializationMiddleware:
         self, middleware: MCPInitializationMiddleware
     ) -> None:
         """Test MCP protocol request detection for wrong HTTP method."""
-        request = Mock()
-        request.method = "GET"
-        request.headers = {"content-type": "application/json"}
+        request = _FakeRequest(
+            method="GET", headers={"content-type": "application/json"}
+        )
 
         assert middleware._is_mcp_protocol_request(request) is False
 
@@ -90,90 +196,109 @@ class TestMCPInitializationMiddleware:
         self, middleware: MCPInitializationMiddleware
     ) -> None:
         """Test MCP protocol request detection for wrong content type."""
-        request = Mock()
-        request.method = "POST"
-        request.headers = {"content-type": "text/plain"}
+        request = _FakeRequest(method="POST", headers={"content-type": "text/plain"})
 
         assert middleware._is_mcp_protocol_request(request) is False
 
-    @pytest.mark.asyncio
-    async def test_check_request_body_for_protocol_initialize(
+    def test_is_mcp_protocol_request_json_with_charset(
         self, middleware: MCPInitializationMiddleware
     ) -> None:
-        """Test protocol request detection for initialize method."""
-        request = Mock()
-        body_data = {
-            "jsonrpc": "2.0",
-            "id": 1,
-            "method": "initialize",
-            "params": {"protocolVersion": "2024-11-05"},
-        }
-        request.body = AsyncMock(return_value=json.dumps(body_data).encode())
+        """Test MCP protocol request detection for JSON with a charset."""
+        request = _FakeRequest(
+            method="POST", headers={"content-type": "application/json; charset=utf-8"}
+        )
 
-        is_protocol, data = await middleware._check_request_body_for_protocol(request)
-        assert is_protocol is True
-        assert data == body_data
+        assert middleware._is_mcp_protocol_request(request) is True
 
-    @pytest.mark.asyncio
-    async def test_check_request_body_for_protocol_initialized(
+    def test_is_mcp_protocol_request_json_only_in_parameter(
         self, middleware: MCPInitializationMiddleware
     ) -> None:
-        """Test protocol request detection for initialized notification."""
-        request = Mock()
-        body_data = {"jsonrpc": "2.0", "method": "notifications/initialized"}
-        request.body = AsyncMock(return_value=json.dumps(body_data).encode())
+        """Test that application/json outside the media type is not matched."""
+        request = _FakeRequest(
+            method="POST", headers={"content-type": "text/plain; note=application/json"}
+        )
 
-        is_protocol, data = await middleware._check_request_body_for_protocol(request)
-        assert is_protocol is True
-        assert data == body_data
+        assert middleware._is_mcp_protocol_request(request) is False
 
-    @pytest.mark.asyncio
-    async def test_check_request_body_for_protocol_ping(
+    def test_is_mcp_protocol_request_empty_content_length(
         self, middleware: MCPInitializationMiddleware
     ) -> None:
-        """Test protocol request detection for ping method."""
-        request = Mock()
-        body_data = {"jsonrpc": "2.0", "id": 2, "method": "ping"}
-        request.body = AsyncMock(return_value=json.dumps(body_data).encode())
+        """Test MCP protocol request detection for a declared empty body."""
+        request = _FakeRequest(
+            method="POST",
+            headers={"content-type": "application/json", "content-length": "0"},
+        )
 
-        is_protocol, data = await middleware._check_request_body_for_protocol(request)
-        assert is_protocol is True
-        assert data == body_data
+        assert middleware._is_mcp_protocol_request(request) is False
 
-    @pytest.mark.asyncio
-    async def test_check_request_body_for_protocol_tools_list(
-        self, middleware: MCPInitializationMiddleware
+    @pytest.mark.parametrize(
+        "body,expected_is_protocol,expected_data",
+        [
+            (_INITIALIZE_BODY, True, _INITIALIZE),
+            (_INITIALIZED_BODY, True, _INITIALIZED),
+            (_PING_BODY, True, _PING),
+            # No protocol method name in the body, so it is never parsed
+            (_TOOLS_LIST_BODY, False, None),
+            (b"invalid json", False, None),
+            # These contain a protocol method name, so they reach the parser
+            (b'{"method": "initialize",', False, None),
+            (b'{"method": "initialize", "x": "\xff"}', False, None),
+            (b"", False, None),
+        ],
+        ids=[
+            "initialize",
+            "initialized",
+            "ping",
+            "tools_list",
+            "invalid",
+            "truncated",
+            "invalid_utf8",
+            "empty",
+        ],
+    )
+    def test_check_request_body_for_protocol(
+        self,
+        middleware: MCPInitializationMiddleware,
+        body: bytes,
+        expected_is_protocol: bool,
+        expected_data: dict[str, Any] | None,
     ) -> None:
-        """Test protocol request detection for tools/list method."""
-        request = Mock()
-        body_data = {"jsonrpc": "2.0", "id": 3, "method": "tools/list"}
-        request.body = AsyncMock(return_value=json.dumps(body_data).encode())
-
-        is_protocol, data = await middleware._check_request_body_for_protocol(request)
-        assert is_protocol is False
-        assert data == body_data
+        """Test protocol request detection across request bodies."""
+        is_protocol, data = middleware._check_request_body_for_protocol(body)
+        assert is_protocol is expected_is_protocol
+        assert data == expected_data
 
-    @pytest.mark.asyncio
-    async def test_check_request_body_for_protocol_invalid_json(
+    def test_check_request_body_for_protocol_ignores_nested_method(
         self, middleware: MCPInitializationMiddleware
     ) -> None:
-        """Test protocol request detection for invalid JSON."""
-        request = Mock()
-        request.body = AsyncMock(return_value=b"invalid json")
+        """Test that a nested "method" key cannot pass as a protocol method."""
+        # The nested ping precedes the real method, so a scan for the first
+        # "method" field would wrongly let this tools/call through
+        body = (
+            b'{"jsonrpc":"2.0","id":5,'
+            b'"params":{"name":"create_envelope","arguments":{"method":"ping"}},'
+            b'"method":"tools/call"}'
+        )
 
-        is_protocol, data = await middleware._check_request_body_for_protocol(request)
+        is_protocol, data = middleware._check_request_body_for_protocol(body)
         assert is_protocol is False
-        assert data is None
+        assert data is not None
+        assert data["method"] == "tools/call"
 
-    @pytest.mark.asyncio
-    async def test_check_request_body_for_protocol_empty_body(
+    def test_check_request_body_for_protocol_skips_parse_without_marker(
         self, middleware: MCPInitializationMiddleware
     ) -> None:
-        """Test protocol request detection for empty body."""
-        request = Mock()
-        request.body = AsyncMock(return_value=b"")
+        """Test large non-protocol bodies are rejected without JSON parsing."""
+        body_data = {
+            "jsonrpc": "2.0",
+            "id": 4,
+            "method": "tools/call",
+            "params": {"name": "create_envelope", "arguments": {"x": "a" * 2**20}},
+        }
+        body = orjson.dumps(body_data)
 
-        is_protocol, data = await middleware._check_request_body_for_protocol(request)
+        with patch("app.auth.json.loads", side_effect=AssertionError("parsed")):
+            is_protocol, data = middleware._check_request_body_for_protocol(body)
         assert is_protocol is False
         assert data is None
 
@@ -185,13 +310,13 @@ class TestMCPInitializationMiddleware:
         data = {"method": "notifications/initialized"}
 
         # Initially session should not be initialized
-        assert not middleware._is_session_initialized(session_id)
+        assert session_id not in middleware._initialized_sessions
 
         # Handle the notification
         middleware._handle_initialized_notification(session_id, data)
 
         # Now session should be initialized
-        assert middleware._is_session_initialized(session_id)
+        assert session_id in middleware._initialized_sessions
 
     def test_handle_initialized_notification_wrong_method(
         self, middleware: MCPInitializationMiddleware
@@ -204,232 +329,158 @@ class TestMCPInitializationMiddleware:
         middleware._handle_initialized_notification(session_id, data)
 
         # Session should not be initialized
-        assert not middleware._is_session_initialized(session_id)
+        assert session_id not in middleware._initialized_sessions
 
-    def test_create_initialization_error(
+    @pytest.mark.asyncio
+    async def test_send_initialization_error(
         self, middleware: MCPInitializationMiddleware
     ) -> None:
-        """Test creation of initialization error response."""
-        response = middleware._create_initialization_error()
-
-        assert isinstance(response, JSONResponse)
-        assert response.status_code == status.HTTP_400_BAD_REQUEST
-
-        # Check response content
-        content = response.body.decode()
-        data = json.loads(content)
-        assert data["error"] == "MCP session not initialized"
-        assert "initialization handshake" in data["message"]
-        assert data["code"] == "mcp_not_initialized"
-
+        """Test the error response sent to uninitialized sessions."""
+        sent: list[Message] = []
+
+        async def send(message: Message) -> None:
+            sent.append(message)
+
+        await middleware._send_initialization_error(send)
+
+        start, body = sent
+        assert start["status"] == status.HTTP_400_BAD_REQUEST
+        headers = dict(start["headers"])
+        assert headers[b"content-type"] == b"application/json"
+        assert headers[b"content-length"] == str(len(body["body"])).encode()
+
+        # Check response content against the exact compact encoding
+        assert body["body"] == _EXPECTED_ERROR_BODY
+
+    @pytest.mark.parametrize(
+        "method,body,pre_initialized,expected_status",
+        [
+            ("POST", _INITIALIZE_BODY, False, status.HTTP_200_OK),
+            ("GET", b"", False, status.HTTP_400_BAD_REQUEST),
+            ("GET", b"", True, status.HTTP_200_OK),
+            ("POST", _TOOLS_CALL_BODY, False, status.HTTP_400_BAD_REQUEST),
+            ("POST", _TOOLS_CALL_BODY, True, status.HTTP_200_OK),
+        ],
+        ids=[
+            "initialize",
+            "non_protocol_uninitialized",
+            "non_protocol_initialized",
+            "tools_call_uninitialized",
+            "tools_call_initialized",
+        ],
+    )
     @pytest.mark.asyncio
-    async def test_dispatch_protocol_request_initialize(
-        self, middleware: MCPInitializationMiddleware, mock_request: Mock
+    async def test_call(
+        self,
+        middleware: MCPInitializationMiddleware,
+        downstream: _RecordingApp,
+        method: str,
+        body: bytes,
+        pre_initialized: bool,
+        expected_status: int,
     ) -> None:
-        """Test dispatch for initialize protocol request."""
-        body_data = {
-            "jsonrpc": "2.0",
-            "id": 1,
-            "method": "initialize",
-            "params": {"protocolVersion": "2024-11-05"},
-        }
-        mock_request.body = AsyncMock(return_value=json.dumps(body_data).encode())
-
-        # Mock call_next to return a response
-        mock_response = Mock()
-        call_next = AsyncMock(return_value=mock_response)
-
-        # Mock request._receive attribute for body reconstruction
-        mock_request._receive = None
+        """Test ASGI call outcomes by request kind and session state."""
+        if pre_initialized:
+            middleware._add_initialized_session(_SESSION_ID)
+        headers = _JSON_HEADERS if method == "POST" else {"user-agent": "test-client"}
 
-        response = await middleware.dispatch(mock_request, call_next)
-
-        # Should call next middleware and return its response
-        call_next.assert_called_once_with(mock_request)
-        assert response == mock_response
+        status_code = await _call_middleware(
+            middleware, method=method, headers=headers, body=body
+        )
 
-        # Check that request body was reconstructed
-        assert hasattr(mock_request, "_receive")
+        assert status_code == expected_status
+        # Rejected requests never reach the downstream app; accepted ones
+        # arrive with the original body replayed
+        if expected_status == status.HTTP_200_OK:
+            assert downstream.bodies == [body]
+        else:
+            assert downstream.bodies == []
 
     @pytest.mark.asyncio
-    async def test_dispatch_protocol_request_initialized(
-        self, middleware: MCPInitializationMiddleware, mock_request: Mock
+    async def test_call_protocol_request_initialized(
+        self, middleware: MCPInitializationMiddleware, downstream: _RecordingApp
     ) -> None:
-        """Test dispatch for initialized notification."""
-        body_data = {"jsonrpc": "2.0", "method": "notifications/initialized"}
-        mock_request.body = AsyncMock(return_value=json.dumps(body_data).encode())
-
-        # Mock session ID
-        mock_request.client.host = "127.0.0.1"
-        mock_request.headers = {
-            "user-agent": "test-client",
-            "content-type": "application/json",
-        }
-
-        # Mock call_next to return a response
-        mock_response = Mock()
-        call_next = AsyncMock(return_value=mock_response)
-
-        # Mock request._receive attribute for body reconstruction
-        mock_request._receive = None
-
-        response = await middleware.dispatch(mock_request, call_next)
+        """Test ASGI call for initialized notification."""
+        status_code = await _call_middleware(middleware, body=_INITIALIZED_BODY)
 
-        # Should call next middleware and return its response
-        call_next.assert_called_once_with(mock_request)
-        assert response == mock_response
+        assert status_code == status.HTTP_200_OK
+        assert downstream.bodies == [_INITIALIZED_BODY]
 
         # Session should now be marked as initialized
-        session_id = middleware._get_session_id(mock_request)
-        assert middleware._is_session_initialized(session_id)
+        assert middleware._is_session_initialized(_SESSION_ID)
 
     @pytest.mark.asyncio
-    async def test_dispatch_non_protocol_request_uninitialized(
-        self, middleware: MCPInitializationMiddleware, mock_request: Mock
+    async def test_call_protocol_request_chunked_body(
+        self, middleware: MCPInitializationMiddleware, downstream: _RecordingApp
     ) -> None:
-        """Test dispatch for non-protocol request from uninitialized session."""
-        # Make it not look like a protocol request
-        mock_request.method = "GET"
-
-        # Mock session ID
-        mock_request.client.host = "127.0.0.1"
-        mock_request.headers = {"user-agent": "test-client"}
-
-        call_next = AsyncMock()
-
-        response = await middleware.dispatch(mock_request, call_next)
+        """Test ASGI call for a protocol request body split across messages."""
+        status_code = await _call_middleware(
+            middleware, body=_INITIALIZED_BODY, chunk_size=7
+        )
 
-        # Should return error response without calling next middleware
-        call_next.assert_not_called()
-        assert isinstance(response, JSONResponse)
-        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        # The chunks are joined before parsing and replayed as one message
+        assert status_code == status.HTTP_200_OK
+        assert downstream.bodies == [_INITIALIZED_BODY]
+        assert middleware._is_session_initialized(_SESSION_ID)
 
     @pytest.mark.asyncio
-    async def test_dispatch_non_protocol_request_initialized(
-        self, middleware: MCPInitializationMiddleware, mock_request: Mock
+    async def test_call_passes_through_non_http_scope(
+        self, middleware: MCPInitializationMiddleware
     ) -> None:
-        """Test dispatch for non-protocol request from initialized session."""
-        # Make it not look like a protocol request
-        mock_request.method = "GET"
-
-        # Mock session ID and mark as initialized
-        mock_request.client.host = "127.0.0.1"
-        mock_request.headers = {"user-agent": "test-client"}
-        session_id = middleware._get_session_id(mock_request)
-        middleware._add_initialized_session(session_id)
+        """Test that non-HTTP scopes bypass the initialization check."""
+        calls: list[tuple[Scope, Receive, Send]] = []
 
-        # Mock call_next to return a response
-        mock_response = Mock()
-        call_next = AsyncMock(return_value=mock_response)
+        async def app(scope: Scope, receive: Receive, send: Send) -> None:
+            calls.append((scope, receive, send))
 
-        response = await middleware.dispatch(mock_request, call_next)
-
-        # Should call next middleware and return its response
-        call_next.assert_called_once_with(mock_request)
-        assert response == mock_response
-
-    @pytest.mark.asyncio
-    async def test_dispatch_tools_call_uninitialized(
-        self, middleware: MCPInitializationMiddleware, mock_request: Mock
-    ) -> None:
-        """Test dispatch for tools/call from uninitialized session."""
-        body_data = {
-            "jsonrpc": "2.0",
-            "id": 1,
-            "method": "tools/call",
-            "params": {"name": "create_envelope", "arguments": {}},
-        }
-        mock_request.body = AsyncMock(return_value=json.dumps(body_data).encode())
+        async def receive() -> Message:
+            return {"type": "lifespan.startup"}
 
-        # Mock session ID
-        mock_request.client.host = "127.0.0.1"
-        mock_request.headers = {
-            "user-agent": "test-client",
-            "content-type": "application/json",
-        }
+        async def send(message: Message) -> None:
+            pass
 
-        call_next = AsyncMock()
+        middleware.app = app
+        scope: Scope = {"type": "lifespan"}
 
-        response = await middleware.dispatch(mock_request, call_next)
+        await middleware(scope, receive, send)
 
-        # Should return error response without calling next middleware
-        call_next.assert_not_called()
-        assert isinstance(response, JSONResponse)
-        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        # The scope and callables are handed over untouched
+        assert calls == [(scope, receive, send)]
 
     @pytest.mark.asyncio
     async def test_full_initialization_flow(
-        self, middleware: MCPInitializationMiddleware
+        self, middleware: MCPInitializationMiddleware, downstream: _RecordingApp
     ) -> None:
         """Test a complete initialization flow."""
-
-        # Create mock requests for the flow
-        def create_mock_request(method: str, body_data: dict) -> Mock:
-            request = Mock(spec=Request)
-            request.method = "POST"
-            request.headers = {
-                "content-type": "application/json",
-                "user-agent": "test-client",
-            }
-            request.client = Mock()
-            request.client.host = "127.0.0.1"
-            request.body = AsyncMock(return_value=json.dumps(body_data).encode())
-            request._receive = None
-            return request
-
-        call_next = AsyncMock(return_value=Mock())
-
         # 1. Initialize request
-        init_request = create_mock_request(
-            "initialize",
-            {
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "initialize",
-                "params": {"protocolVersion": "2024-11-05"},
-            },
-        )
-
-        await middleware.dispatch(init_request, call_next)
-        assert call_next.called
-        call_next.reset_mock()
+        assert await _call_middleware(middleware, body=_INITIALIZE_BODY) == 200
 
         # 2. Initialized notification
-        initialized_request = create_mock_request(
-            "notifications/initialized",
-            {"jsonrpc": "2.0", "method": "notifications/initialized"},
-        )
-
-        await middleware.dispatch(initialized_request, call_next)
-        assert call_next.called
-        call_next.reset_mock()
+        assert await _call_middleware(middleware, body=_INITIALIZED_BODY) == 200
 
         # 3. Tool call (should now work)
-        tool_request = create_mock_request(
-            "tools/call",
-            {
-                "jsonrpc": "2.0",
-                "id": 2,
-                "method": "tools/call",
-                "params": {"name": "create_envelope", "arguments": {}},
-            },
-        )
+        assert await _call_middleware(middleware, body=_TOOLS_CALL_BODY) == 200
 
-        await middleware.dispatch(tool_request, call_next)
-        assert call_next.called
+        assert downstream.bodies == [
+            _INITIALIZE_BODY,
+            _INITIALIZED_BODY,
+            _TOOLS_CALL_BODY,
+        ]
 
 
 class TestMCPInitializationMiddlewareMemoryManagement:
     """Test suite for TTL-based session memory management."""
 
-    @pytest.fixture
-    def middleware_with_ttl(self) -> MCPInitializationMiddleware:
+    @pytest_asyncio.fixture
+    async def middleware_with_ttl(
+        self,
+    ) -> AsyncGenerator[MCPInitializationMiddleware, None]:
         """Create middleware with custom TTL settings."""
-        mock_app = Mock()
-        middleware = MCPInitializationMiddleware(mock_app)
+        middleware = MCPInitializationMiddleware(_RecordingApp())
         middleware._session_ttl = 2  # 2 seconds for testing
         middleware._cleanup_interval = 1  # 1 second cleanup interval
-        return middleware
+        yield middleware
+        await _shutdown_cleanup_task(middleware)
 
     def test_session_ttl_initialization(self) -> None:
         """Test that TTL settings are properly initialized."""
@@ -446,7 +497,7 @@ class TestMCPInitializationMiddlewareMemoryManagement:
     ) -> None:
         """Test that sessions are added with current timestamp."""
         session_id = "test-session"
-        current_time = time.time()
+        current_time = time.monotonic()
 
         middleware_with_ttl._add_initialized_session(session_id)
 
@@ -454,6 +505,16 @@ class TestMCPInitializationMiddlewareMemoryManagement:
         stored_time = middleware_with_ttl._initialized_sessions[session_id]
         assert abs(stored_time - current_time) < 1  # Within 1 second
 
+    def test_add_initialized_session_refresh_moves_to_end(
+        self, middleware_with_ttl: MCPInitializationMiddleware
+    ) -> None:
+        """Test that re-adding a session makes it the newest entry."""
+        middleware_with_ttl._add_initialized_session("first")
+        middleware_with_ttl._add_initialized_session("second")
+        middleware_with_ttl._add_initialized_session("first")
+
+        assert list(middleware_with_ttl._initialized_sessions) == ["second", "first"]
+
     def test_is_session_initialized_valid_session(
         self, middleware_with_ttl: MCPInitializationMiddleware
     ) -> None:
@@ -471,7 +532,7 @@ class TestMCPInitializationMiddlewareMemoryManagement:
 
         # Add session with old timestamp
         middleware_with_ttl._initialized_sessions[session_id] = (
-            time.time() - 10
+            time.monotonic() - 10
         )  # 10 seconds ago
 
         # Should return False and remove the session
@@ -488,7 +549,7 @@ class TestMCPInitializationMiddlewareMemoryManagement:
         self, middleware_with_ttl: MCPInitializationMiddleware
     ) -> None:
         """Test manual cleanup of expired sessions."""
-        current_time = time.time()
+        current_time = time.monotonic()
 
         # Add mix of expired and valid sessions
         middleware_with_ttl._initialized_sessions.update(
@@ -519,12 +580,12 @@ class TestMCPInitializationMiddlewareMemoryManagement:
         assert middleware_with_ttl._cleanup_task is not None
         assert not middleware_with_ttl._cleanup_task.done()
 
-        # Stop cleanup task
+        # Stop cleanup task; it exits promptly instead of finishing its sleep
         middleware_with_ttl._stop_cleanup_task()
 
-        # Task should be cancelled or completed
-        await asyncio.sleep(0.1)  # Allow cancellation to process
+        await asyncio.wait_for(middleware_with_ttl._cleanup_task, timeout=1)
         assert middleware_with_ttl._cleanup_task.done()
+        assert not middleware_with_ttl._cleanup_task.cancelled()
 
     @pytest.mark.asyncio
     async def test_background_cleanup_removes_expired_sessions(
@@ -532,7 +593,7 @@ class TestMCPInitializationMiddlewareMemoryManagement:
     ) -> None:
         """Test that background cleanup actually removes expired sessions."""
         # Add expired and valid sessions
-        current_time = time.time()
+        current_time = time.monotonic()
         middleware_with_ttl._initialized_sessions.update(
             {
                 "expired": current_time - 10,  # Expired
@@ -551,7 +612,7 @@ class TestMCPInitializationMiddlewareMemoryManagement:
         assert "valid" in middleware_with_ttl._initialized_sessions
 
         # Cleanup
-        middleware_with_ttl._stop_cleanup_task()
+        await _shutdown_cleanup_task(middleware_with_ttl)
 
     @pytest.mark.asyncio
     async def test_memory_bounded_under_load(
@@ -576,6 +637,21 @@ class TestMCPInitializationMiddlewareMemoryManagement:
         assert removed_count == 1000
         assert len(middleware_with_ttl._initialized_sessions) == 0
 
+    def test_memory_capped_at_max_sessions(
+        self, middleware_with_ttl: MCPInitializationMiddleware
+    ) -> None:
+        """Test that the oldest sessions are evicted beyond the session cap."""
+        middleware_with_ttl._max_sessions = 50
+
+        for i in range(150):
+            middleware_with_ttl._add_initialized_session(f"session_{i}")
+
+        sessions = middleware_with_ttl._initialized_sessions
+        assert len(sessions) == 50
+        assert "session_99" not in sessions
+        assert "session_100" in sessions
+        assert "session_149" in sessions
+
     def test_environment_variable_configuration(self) -> None:
         """Test that TTL can be configured via environment variables."""
         with patch.dict(
@@ -587,6 +663,16 @@ class TestMCPInitializationMiddlewareMemoryManagement:
             assert middleware._session_ttl == 7200  # 2 hours
             assert middleware._cleanup_interval == 600  # 10 minutes
 
+    def test_max_sessions_environment_variable(self) -> None:
+        """Test that the session cap can be configured and defaults sanely."""
+        with patch.dict("os.environ", {"MCP_MAX_SESSIONS": "500"}):
+            middleware = MCPInitializationMiddleware(Mock())
+            assert middleware._max_sessions == 500
+
+        with patch.dict("os.environ", {"MCP_MAX_SESSIONS": "0"}):
+            middleware = MCPInitializationMiddleware(Mock())
+            assert middleware._max_sessions == 10000
+
     def test_environment_variable_defaults(self) -> None:
         """Test default values when environment variables are not set."""
         with patch.dict("os.environ", {}, clear=True):
@@ -596,6 +682,7 @@ class TestMCPInitializationMiddlewareMemoryManagement:
             # Should use defaults (these will be defined in implementation)
             assert middleware._session_ttl == 3600  # 1 hour
             assert middleware._cleanup_interval == 300  # 5 minutes
+            assert middleware._max_sessions == 10000
 
     def test_session_ttl_with_invalid_environment_variables(self) -> None:
         """Test handling of invalid environment variable values."""
@@ -634,36 +721,20 @@ class TestMCPInitializationMiddlewareMemoryManagement:
         assert not middleware_with_ttl._cleanup_task.done()
 
         # Cleanup
-        middleware_with_ttl._stop_cleanup_task()
+        await _shutdown_cleanup_task(middleware_with_ttl)
 
     @pytest.mark.asyncio
-    async def test_dispatch_with_ttl_session_management(
+    async def test_call_with_ttl_session_management(
         self, middleware_with_ttl: MCPInitializationMiddleware
     ) -> None:
-        """Test dispatch behavior with TTL-based session management."""
-        # Create mock request
-        request = Mock(spec=Request)
-        request.method = "POST"
-        request.headers = {
-            "content-type": "application/json",
-            "user-agent": "test-client",
-        }
-        request.client = Mock()
-        request.client.host = "127.0.0.1"
-
-        body_data = {"jsonrpc": "2.0", "method": "notifications/initialized"}
-        request.body = AsyncMock(return_value=json.dumps(body_data).encode())
-
-        call_next = AsyncMock(return_value=Mock())
-
+        """Test ASGI call behavior with TTL-based session management."""
         # First request should process initialization
-        await middleware_with_ttl.dispatch(request, call_next)
-        session_id = middleware_with_ttl._get_session_id(request)
+        await _call_middleware(middleware_with_ttl, body=_INITIALIZED_BODY)
 
-        assert middleware_with_ttl._is_session_initialized(session_id)
+        assert middleware_with_ttl._is_session_initialized(_SESSION_ID)
 
         # Wait for session to expire
         await asyncio.sleep(3)
 
         # Session should now be expired
-        assert not middleware_with_ttl._is_session_initialized(session_id)
+        assert not middleware_with_ttl._is_session_initialized(_SESSION_ID)
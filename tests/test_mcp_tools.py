@@ -1,35 +1,74 @@
 import asyncio
-import json
-from collections.abc import Generator
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import Any
 
+import orjson
 import pytest
+import pytest_asyncio
 from fastmcp import FastMCP
 
 from app.fastmcp_server import create_fastmcp_server
 
+# Expected JSON types of each tool parameter, and which parameters are required
+_EXPECTED_PARAMETER_TYPES: Mapping[str, Mapping[str, str]] = MappingProxyType(
+    {
+        "create_envelope": {
+            "category": "string",
+            "budgeted_amount": "number",
+            "starting_balance": "number",
+            "description": "string",
+        },
+        "list_transactions": {"envelope_id": "integer"},
+        "get_envelope": {"envelope_id": "integer"},
+    }
+)
+_EXPECTED_REQUIRED: Mapping[str, frozenset[str]] = MappingProxyType(
+    {
+        "create_envelope": frozenset({"category", "budgeted_amount"}),
+        "list_transactions": frozenset(),
+        "get_envelope": frozenset({"envelope_id"}),
+    }
+)
+
+
+def _json_types(prop: Mapping[str, Any]) -> set[str]:
+    """Return the non-null JSON types a property schema accepts."""
+    # FastMCP renders Optional parameters as anyOf [<type>, null]
+    options = prop.get("anyOf", (prop,))
+    return {option["type"] for option in options} - {"null"}
+
 
 class TestMCPTools:
     """Test suite for MCP tools functionality using FastMCP API."""
 
-    @pytest.fixture
+    @pytest.fixture(scope="class")
     def server(self) -> FastMCP:
-        """Create a test FastMCP server instance."""
+        """Create a test FastMCP server instance shared by the class."""
         return create_fastmcp_server(
             "testing", enable_auth=False, enable_init_check=False
         )
 
-    @pytest.fixture
-    def event_loop(self) -> Generator[asyncio.AbstractEventLoop, None, None]:
-        """Create an event loop for async tests."""
-        loop = asyncio.new_event_loop()
-        yield loop
-        loop.close()
+    @pytest_asyncio.fixture(scope="class", loop_scope="session")
+    async def tools(self, server: FastMCP) -> dict[str, Any]:
+        """Resolve the server's registered tools once for the class."""
+        return await server.get_tools()
+
+    @pytest_asyncio.fixture(scope="class", loop_scope="session")
+    async def seeded_envelope(self, tools: dict[str, Any]) -> dict[str, Any]:
+        """Create one envelope shared by the tests that only need one to exist."""
+        result = await tools["create_envelope"].fn(
+            category="Seed Category",
+            budgeted_amount=300.0,
+            starting_balance=200.0,
+            description="Shared test envelope",
+        )
+        envelope: dict[str, Any] = orjson.loads(result)
+        return envelope
 
     @pytest.mark.asyncio
-    async def test_create_envelope_tool(self, server: FastMCP) -> None:
+    async def test_create_envelope_tool(self, tools: dict[str, Any]) -> None:
         """Test the create_envelope MCP tool via FastMCP API."""
-        # Get the tool function from server
-        tools = await server.get_tools()
         create_envelope_tool = tools["create_envelope"]
 
         # Test creating an envelope
@@ -41,57 +80,39 @@ class TestMCPTools:
         )
 
         # Parse the JSON response
-        envelope_data = json.loads(result)
+        envelope_data = orjson.loads(result)
         assert envelope_data["category"] == "Groceries"
         assert envelope_data["budgeted_amount"] == 500.0
         assert envelope_data["starting_balance"] == 100.0
         assert "id" in envelope_data
 
     @pytest.mark.asyncio
-    async def test_list_envelopes_tool(self, server: FastMCP) -> None:
+    async def test_list_envelopes_tool(
+        self, tools: dict[str, Any], seeded_envelope: dict[str, Any]
+    ) -> None:
         """Test the list_envelopes MCP tool via FastMCP API."""
-        tools = await server.get_tools()
-
-        # Create a test envelope first
-        create_envelope_tool = tools["create_envelope"]
-        await create_envelope_tool.fn(
-            category="Test Category",
-            budgeted_amount=200.0,
-            starting_balance=50.0,
-            description="Test envelope",
-        )
-
         # Test listing envelopes
         list_envelopes_tool = tools["list_envelopes"]
         result = await list_envelopes_tool.fn()
 
         # Parse the JSON response
-        envelopes_data = json.loads(result)
+        envelopes_data = orjson.loads(result)
         assert isinstance(envelopes_data, list)
         assert len(envelopes_data) >= 1
 
-        test_envelope = next(
-            (env for env in envelopes_data if env["category"] == "Test Category"), None
-        )
+        by_id = {env["id"]: env for env in envelopes_data}
+        test_envelope = by_id.get(seeded_envelope["id"])
         assert test_envelope is not None
-        assert test_envelope["budgeted_amount"] == 200.0
-        assert test_envelope["starting_balance"] == 50.0
+        assert test_envelope["category"] == seeded_envelope["category"]
+        assert test_envelope["budgeted_amount"] == seeded_envelope["budgeted_amount"]
+        assert test_envelope["starting_balance"] == seeded_envelope["starting_balance"]
 
     @pytest.mark.asyncio
-    async def test_create_transaction_tool(self, server: FastMCP) -> None:
+    async def test_create_transaction_tool(
+        self, tools: dict[str, Any], seeded_envelope: dict[str, Any]
+    ) -> None:
         """Test the create_transaction MCP tool via FastMCP API."""
-        tools = await server.get_tools()
-
-        # Create an envelope first
-        create_envelope_tool = tools["create_envelope"]
-        envelope_result = await create_envelope_tool.fn(
-            category="Test Budget",
-            budgeted_amount=300.0,
-            starting_balance=200.0,
-            description="Test budget for transactions",
-        )
-        envelope_data = json.loads(envelope_result)
-        envelope_id = envelope_data["id"]
+        envelope_id = seeded_envelope["id"]
 
         # Test creating a transaction
         create_transaction_tool = tools["create_transaction"]
@@ -104,7 +125,7 @@ class TestMCPTools:
         )
 
         # Parse the JSON response
-        transaction_data = json.loads(result)
+        transaction_data = orjson.loads(result)
         assert transaction_data["envelope_id"] == envelope_id
         assert transaction_data["amount"] == 50.0
         assert transaction_data["description"] == "Test grocery purchase"
@@ -113,20 +134,39 @@ class TestMCPTools:
         assert "id" in transaction_data
 
     @pytest.mark.asyncio
-    async def test_get_budget_summary_tool(self, server: FastMCP) -> None:
-        """Test the get_budget_summary MCP tool via FastMCP API."""
-        tools = await server.get_tools()
+    async def test_concurrent_create_transaction_calls(
+        self, tools: dict[str, Any], seeded_envelope: dict[str, Any]
+    ) -> None:
+        """Test that concurrent create_transaction calls each get their own row."""
+        envelope_id = seeded_envelope["id"]
+        create_transaction_tool = tools["create_transaction"]
 
-        # Create test data
-        create_envelope_tool = tools["create_envelope"]
-        envelope_result = await create_envelope_tool.fn(
-            category="Summary Test",
-            budgeted_amount=1000.0,
-            starting_balance=800.0,
-            description="Test envelope for summary",
+        results = await asyncio.gather(
+            *(
+                create_transaction_tool.fn(
+                    envelope_id=envelope_id,
+                    amount=1.0 + i,
+                    description=f"Concurrent purchase {i}",
+                    date="2024-02-01",
+                    type="expense",
+                )
+                for i in range(8)
+            )
         )
-        envelope_data = json.loads(envelope_result)
-        envelope_id = envelope_data["id"]
+
+        transactions = [orjson.loads(result) for result in results]
+        assert len({t["id"] for t in transactions}) == 8
+        assert all(t["envelope_id"] == envelope_id for t in transactions)
+        assert [t["description"] for t in transactions] == [
+            f"Concurrent purchase {i}" for i in range(8)
+        ]
+
+    @pytest.mark.asyncio
+    async def test_get_budget_summary_tool(
+        self, tools: dict[str, Any], seeded_envelope: dict[str, Any]
+    ) -> None:
+        """Test the get_budget_summary MCP tool via FastMCP API."""
+        envelope_id = seeded_envelope["id"]
 
         # Create a transaction
         create_transaction_tool = tools["create_transaction"]
@@ -143,7 +183,7 @@ class TestMCPTools:
         result = await get_budget_summary_tool.fn()
 
         # Parse the JSON response
-        summary_data = json.loads(result)
+        summary_data = orjson.loads(result)
         assert "total_envelopes" in summary_data
         assert "total_budgeted" in summary_data
         assert "total_current_balance" in summary_data
@@ -151,9 +191,8 @@ class TestMCPTools:
         assert "envelopes" in summary_data
 
     @pytest.mark.asyncio
-    async def test_error_handling(self, server: FastMCP) -> None:
+    async def test_error_handling(self, tools: dict[str, Any]) -> None:
         """Test error handling in MCP tools via FastMCP API."""
-        tools = await server.get_tools()
         create_envelope_tool = tools["create_envelope"]
 
         # Test with empty category (should cause error)
@@ -167,46 +206,18 @@ class TestMCPTools:
         # Should return an error message
         assert "Error:" in result
 
-    @pytest.mark.asyncio
-    async def test_tool_schema_generation(self, server: FastMCP) -> None:
+    @pytest.mark.parametrize("tool_name", sorted(_EXPECTED_PARAMETER_TYPES))
+    def test_tool_schema_generation(
+        self, tools: dict[str, Any], tool_name: str
+    ) -> None:
         """Test the input schema generation for MCP tools via FastMCP API."""
-        tools = await server.get_tools()
-
-        # Test schema for create_envelope
-        create_envelope_tool = tools.get("create_envelope")
-        assert create_envelope_tool is not None
-        schema = create_envelope_tool.parameters
-        assert schema["type"] == "object"
-        assert "category" in schema["properties"]
-        assert schema["properties"]["category"]["type"] == "string"
-        assert "budgeted_amount" in schema["properties"]
-        assert schema["properties"]["budgeted_amount"]["type"] == "number"
-        assert "starting_balance" in schema["properties"]
-        assert "description" in schema["properties"]
-        assert "category" in schema["required"]
-        assert "budgeted_amount" in schema["required"]
-        assert "starting_balance" not in schema.get("required", [])
-        assert "description" not in schema.get("required", [])
-
-        # Test schema for list_transactions
-        list_transactions_tool = tools.get("list_transactions")
-        assert list_transactions_tool is not None
-        schema = list_transactions_tool.parameters
+        tool = tools.get(tool_name)
+        assert tool is not None
+        schema = tool.parameters
         assert schema["type"] == "object"
-        assert "envelope_id" in schema["properties"]
-        # FastMCP generates nullable integers with anyOf pattern for Optional types
-        envelope_id_schema = schema["properties"]["envelope_id"]
-        # FastMCP may use anyOf for Optional types instead of direct type field
-        if "anyOf" in envelope_id_schema:
-            assert any(t.get("type") == "integer" for t in envelope_id_schema["anyOf"])
-        else:
-            assert envelope_id_schema["type"] == "integer"
-        assert "envelope_id" not in schema.get("required", [])
-
-        # Test schema for get_envelope
-        get_envelope_tool = tools.get("get_envelope")
-        assert get_envelope_tool is not None
-        schema = get_envelope_tool.parameters
-        assert "envelope_id" in schema["properties"]
-        assert schema["properties"]["envelope_id"]["type"] == "integer"
-        assert "envelope_id" in schema["required"]
+        actual_types = {
+            name: _json_types(prop) for name, prop in schema["properties"].items()
+        }
+        for name, expected_type in _EXPECTED_PARAMETER_TYPES[tool_name].items():
+            assert expected_type in actual_types[name], name
+        assert set(schema.get("required", ())) == _EXPECTED_REQUIRED[tool_name]
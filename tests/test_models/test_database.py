@@ -1,4 +1,3 @@
-import os
 from collections.abc import Generator
 from datetime import date
 
@@ -9,37 +8,84 @@ from app.models.database import Database
 
 @pytest.fixture
 def db() -> Generator[Database, None, None]:
-    db_path = "test_temp_db.duckdb"
-    # Ensure the database file does not exist before creating a new one
-    if os.path.exists(db_path):
-        os.remove(db_path)
-
-    database = Database(db_path=db_path)
+    # A fresh in-memory database per test; nothing touches the filesystem and
+    # parallel xdist workers cannot collide
+    database = Database(db_path=":memory:")
     yield database
     database.close()
-    # Clean up the database file after tests are done
-    if os.path.exists(db_path):
-        os.remove(db_path)
 
 
-def test_insert_and_get_envelope(db: Database) -> None:
-    # Test inserting a new envelope and retrieving it by ID
-    env_id = db.insert_envelope("Groceries", 500.00, 100.00, "Monthly grocery budget")
-    assert env_id is not None
-    envelope = db.get_envelope_by_id(env_id)
-    assert envelope is not None
-    assert envelope["category"] == "Groceries"
-    assert envelope["budgeted_amount"] == 500.00
-    assert envelope["starting_balance"] == 100.00
-    assert envelope["description"] == "Monthly grocery budget"
+class TestEnvelopeCrud:
+    """Envelope CRUD tests sharing one database; each test uses its own category."""
 
+    @pytest.fixture(scope="class")
+    def shared_db(self) -> Generator[Database, None, None]:
+        """Create one in-memory database for the whole class."""
+        database = Database(db_path=":memory:")
+        yield database
+        database.close()
 
-def test_get_envelope_by_category(db: Database) -> None:
-    # Test retrieving an envelope by its category
-    db.insert_envelope("Utilities", 200.00, 50.00, "Electricity, Water, Internet")
-    envelope = db.get_envelope_by_category("Utilities")
-    assert envelope is not None
-    assert envelope["category"] == "Utilities"
+    @pytest.mark.parametrize(
+        "category, budgeted, starting, description",
+        [
+            ("Groceries", 500.00, 100.00, "Monthly grocery budget"),
+            ("Rent", 1200.00, 0.00, "Monthly rent"),
+            ("Pets", 80.00, 15.50, ""),
+        ],
+    )
+    def test_insert_and_get_envelope(
+        self,
+        shared_db: Database,
+        category: str,
+        budgeted: float,
+        starting: float,
+        description: str,
+    ) -> None:
+        # Test inserting a new envelope and retrieving it by ID
+        env_id = shared_db.insert_envelope(category, budgeted, starting, description)
+        assert env_id is not None
+        envelope = shared_db.get_envelope_by_id(env_id)
+        assert envelope is not None
+        assert envelope["category"] == category
+        assert envelope["budgeted_amount"] == budgeted
+        assert envelope["starting_balance"] == starting
+        assert envelope["description"] == description
+
+    def test_get_envelope_by_category(self, shared_db: Database) -> None:
+        # Test retrieving an envelope by its category
+        shared_db.insert_envelope(
+            "Utilities", 200.00, 50.00, "Electricity, Water, Internet"
+        )
+        envelope = shared_db.get_envelope_by_category("Utilities")
+        assert envelope is not None
+        assert envelope["category"] == "Utilities"
+
+    def test_update_envelope(self, shared_db: Database) -> None:
+        # Test updating an existing envelope's details
+        env_id = shared_db.insert_envelope(
+            "Shopping", 300.00, 50.00, "Clothing and other shopping"
+        )
+        updated = shared_db.update_envelope(
+            env_id,
+            category="Online Shopping",
+            budgeted_amount=350.00,
+            description="Online purchases",
+        )
+        assert updated is True
+        envelope = shared_db.get_envelope_by_id(env_id)
+        assert envelope["category"] == "Online Shopping"
+        assert envelope["budgeted_amount"] == 350.00
+        assert envelope["description"] == "Online purchases"
+
+    def test_delete_envelope(self, shared_db: Database) -> None:
+        # Test deleting an envelope
+        env_id = shared_db.insert_envelope(
+            "Entertainment", 100.00, 10.00, "Movies, concerts, etc."
+        )
+        deleted = shared_db.delete_envelope(env_id)
+        assert deleted is True
+        envelope = shared_db.get_envelope_by_id(env_id)
+        assert envelope is None
 
 
 def test_get_all_envelopes(db: Database) -> None:
@@ -53,35 +99,6 @@ def test_get_all_envelopes(db: Database) -> None:
     assert "Transport" in categories
 
 
-def test_update_envelope(db: Database) -> None:
-    # Test updating an existing envelope's details
-    env_id = db.insert_envelope(
-        "Shopping", 300.00, 50.00, "Clothing and other shopping"
-    )
-    updated = db.update_envelope(
-        env_id,
-        category="Online Shopping",
-        budgeted_amount=350.00,
-        description="Online purchases",
-    )
-    assert updated is True
-    envelope = db.get_envelope_by_id(env_id)
-    assert envelope["category"] == "Online Shopping"
-    assert envelope["budgeted_amount"] == 350.00
-    assert envelope["description"] == "Online purchases"
-
-
-def test_delete_envelope(db: Database) -> None:
-    # Test deleting an envelope
-    env_id = db.insert_envelope(
-        "Entertainment", 100.00, 10.00, "Movies, concerts, etc."
-    )
-    deleted = db.delete_envelope(env_id)
-    assert deleted is True
-    envelope = db.get_envelope_by_id(env_id)
-    assert envelope is None
-
-
 def test_insert_duplicate_envelope_category_raises_value_error(db: Database) -> None:
     # Test that inserting an envelope with a duplicate category name raises a ValueError
     db.insert_envelope("Health", 100.00, 0.00, "Gym, supplements")